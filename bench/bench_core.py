@@ -0,0 +1,172 @@
+# bench_core.py - timings and peak memory of the core metadata / scan / table stages on a synthetic tree
+# Run: python bench/bench_core.py --files 100000 [--dir /tmp/synth] [-o results.json]
+# Compare two result files with: python bench/compare.py base.json new.json
+
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchlib import log, result_header, run_stage, write_results
+from synth import add_synth_arguments, make_synthetic_dataset, synth_params
+from dataset_core import (
+    DATA_DIR_NAME,
+    HISTORY_DIR_NAME,
+    METADATA_FILENAME,
+    METADATA_JOURNAL_FILENAME,
+    TagIndex,
+    count_tags_in_metadata,
+    load_metadata,
+    merge_with_video_list,
+    save_metadata,
+    scan_media,
+)
+
+STAGES = (
+    "scan",
+    "scan_cached",
+    "load_metadata",
+    "merge",
+    "count_tags",
+    "tag_index",
+    "save_full",
+    "save_dirty",
+    "populate",
+    "populate_filter",
+)
+SAVE_DIRTY_ROWS = 100
+
+
+def _bench_populate(
+    dd: Path, paths: List[Path], keys: Dict[Path, str], merged, repeat: int, memory: bool
+) -> Dict[str, Dict[str, Any]]:
+    # DatasetManagerApp._populate_tree on a hidden window, including Tk's idle work. Needs a display.
+    try:
+        import dataset_manager
+
+        app = dataset_manager.DatasetManagerApp()
+    except Exception as ex:
+        reason = "no GUI: %s" % ex
+        return {"populate": {"skipped": reason}, "populate_filter": {"skipped": reason}}
+    app.root.withdraw()
+    index = TagIndex(merged)
+    top_tag = max(index.counts().items(), key=lambda kv: kv[1], default=("untagged", 0))[0]
+    app._dataset_dir, app._video_paths, app._metadata, app._tag_index = dd, paths, merged, index
+    app._path_keys = dict(keys)
+    app._use_virtual_tree(app._want_virtual_tree(len(paths)))
+
+    def reset():
+        app._clear_tree()
+        app._row_static = {}
+        app._tag_filter = app._tag_query = None
+
+    def populate():
+        app._populate_tree()
+        app.root.update_idletasks()
+
+    def unfiltered():
+        reset()
+        populate()
+
+    def filtered():
+        app._tag_filter = top_tag
+        app._tag_query = dataset_manager.parse_tag_query(top_tag)
+        populate()
+
+    try:
+        return {
+            "populate": run_stage(populate, repeat, memory, setup=reset),
+            "populate_filter": dict(run_stage(filtered, repeat, memory, setup=unfiltered), query=top_tag),
+        }
+    finally:
+        app.root.destroy()
+
+
+def bench_core(dd: Path, stages: List[str], repeat: int = 3, memory: bool = True) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+
+    def stage(name: str, fn, setup=None):
+        if name in stages:
+            log("%s ..." % name)
+            out[name] = run_stage(fn, repeat, memory, setup)
+            log("%s: %.3f s" % (name, out[name]["seconds"]))
+
+    stage("scan", lambda: scan_media(dd, use_cache=False))
+    paths = scan_media(dd, use_cache=True)
+    stage("scan_cached", lambda: scan_media(dd, use_cache=True))
+    metadata = load_metadata(dd)
+    stage("load_metadata", lambda: load_metadata(dd))
+    keys = {p: str(p.resolve()) for p in paths}
+    stage("merge", lambda: merge_with_video_list(paths, metadata, keys))
+    merged = merge_with_video_list(paths, metadata, keys)
+    stage("count_tags", lambda: count_tags_in_metadata(merged))
+    stage("tag_index", lambda: TagIndex(merged))
+
+    # Saving rewrites the synthetic metadata and adds history: every save_full run starts from the original tree
+    # (no journal, no history, as a first save would), and the original is put back afterwards.
+    data_dir = dd / DATA_DIR_NAME
+    original = (data_dir / METADATA_FILENAME).read_bytes()
+
+    def restore():
+        (data_dir / METADATA_FILENAME).write_bytes(original)
+        (data_dir / METADATA_JOURNAL_FILENAME).unlink(missing_ok=True)
+        shutil.rmtree(data_dir / HISTORY_DIR_NAME, ignore_errors=True)
+
+    try:
+        stage("save_full", lambda: save_metadata(dd, merged), setup=restore)
+        restore()
+        dirty_keys = random.Random(0).sample(sorted(merged), min(SAVE_DIRTY_ROWS, len(merged)))
+        counter = [0]
+
+        def touch():
+            counter[0] += 1
+            for k in dirty_keys:
+                merged[k] = dict(merged[k], notes="bench %d" % counter[0])
+
+        stage("save_dirty", lambda: save_metadata(dd, merged, dirty=dirty_keys), setup=touch)
+    finally:
+        restore()
+
+    if "populate" in stages or "populate_filter" in stages:
+        log("populate ...")
+        merged = merge_with_video_list(paths, metadata, keys)
+        res = _bench_populate(dd, paths, keys, merged, repeat, memory)
+        out.update({k: v for k, v in res.items() if k in stages})
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scan / load / save / merge / count / populate.")
+    parser.add_argument("--dir", help="synthetic dataset directory, reused across runs (default: a temp dir)")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: %s" % ", ".join(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage; the best is reported")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of stdout")
+    add_synth_arguments(parser)
+    args = parser.parse_args(argv)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = sorted(set(stages) - set(STAGES))
+    if unknown:
+        parser.error("unknown stage(s): %s" % ", ".join(unknown))
+    tmp = None
+    dd = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="dataset_bench_"))
+    if not args.dir:
+        tmp = dd
+    try:
+        log("Generating synthetic dataset in %s ..." % dd)
+        params = make_synthetic_dataset(dd, **synth_params(args))
+        results = result_header("core", params)
+        results["options"] = {"repeat": args.repeat, "memory": not args.no_memory}
+        results["stages"] = bench_core(dd, stages, args.repeat, not args.no_memory)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    write_results(results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# bench_previews.py - preview generation throughput across codecs, containers, resolutions, GOP lengths,
+# video frame strategies and worker counts, on clips and images synthesized with OpenCV / Pillow.
+# Needs opencv-python, numpy and pillow. Run: python bench/bench_previews.py [--quick] [-o results.json]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchlib import log, result_header, write_results
+from dataset_core import (
+    DATA_DIR_NAME,
+    PREVIEWS_DIR,
+    PreviewManifest,
+    PreviewScheduler,
+    default_preview_workers,
+    open_preview_store,
+    optional_import,
+    preview_name_for,
+    preview_rel_path,
+    timed_render_preview,
+)
+
+VIDEO_CODECS = "mp4v:.mp4,MJPG:.avi,XVID:.avi,VP80:.webm"
+IMAGE_FORMATS = "JPEG:.jpg,PNG:.png,WEBP:.webp"
+RESOLUTIONS = "640x360,1920x1080"
+GOPS = "12,250"
+STRATEGIES = "keyframe,50%,2s"
+
+
+def _frame(np, i: int, width: int, height: int):
+    # Moving gradients plus a moving box: cheap to make, but not trivially compressible.
+    x = np.arange(width, dtype=np.uint32)
+    y = np.arange(height, dtype=np.uint32)[:, None]
+    img = np.empty((height, width, 3), np.uint8)
+    img[..., 0] = (x + 3 * i) % 256
+    img[..., 1] = (y + 2 * i) % 256
+    img[..., 2] = ((x + y) // 2 + i) % 256
+    bx, by = (7 * i) % max(1, width - width // 8), (5 * i) % max(1, height - height // 8)
+    img[by : by + height // 8, bx : bx + width // 8] = 255
+    return img
+
+
+def measure_gop(path: Path) -> Optional[float]:
+    # Mean frames per keyframe, from the container's packet flags (no decoding).
+    cv2 = optional_import("cv2")
+    cap = cv2.VideoCapture(str(path), cv2.CAP_FFMPEG)
+    try:
+        if not cap.set(cv2.CAP_PROP_FORMAT, -1):
+            return None
+        frames = keys = 0
+        while cap.grab():
+            frames += 1
+            keys += bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME))
+        return round(frames / keys, 1) if keys else None
+    finally:
+        cap.release()
+
+
+def make_clip(path: Path, fourcc: str, size, fps: int, frames: int, gop: int) -> Optional[Dict[str, Any]]:
+    # The keyframe interval is requested through VIDEOWRITER_PROP_KEY_INTERVAL; OpenCV builds whose FFmpeg writer
+    # ignores it keep their default (12), so the GOP actually written is measured and reported. None if the
+    # codec / container cannot be written here.
+    cv2, np = optional_import("cv2"), optional_import("numpy")
+    params = [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, gop] if hasattr(cv2, "VIDEOWRITER_PROP_KEY_INTERVAL") else []
+    try:
+        writer = cv2.VideoWriter(str(path), cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*fourcc), fps, size, params)
+    except cv2.error:
+        return None
+    if not writer.isOpened():
+        return None
+    for i in range(frames):
+        writer.write(_frame(np, i, size[0], size[1]))
+    writer.release()
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    return {"bytes": path.stat().st_size, "gop_requested": gop, "gop": measure_gop(path), "frames": frames, "fps": fps}
+
+
+def make_image(path: Path, fmt: str, size) -> Optional[Dict[str, Any]]:
+    Image, np = optional_import("PIL.Image"), optional_import("numpy")
+    img = _frame(np, 0, size[0], size[1])
+    img[::2, ::3] ^= 0x35  # some texture so PNG / lossless WebP do real work
+    try:
+        Image.fromarray(img).save(path, fmt)
+    except (OSError, KeyError, ValueError):
+        return None
+    return {"bytes": path.stat().st_size}
+
+
+def _copies(src: Path, dest: Path, n: int) -> List[Path]:
+    # n distinct paths for one sample (hard links where possible), so each worker gets its own files.
+    dest.mkdir(parents=True, exist_ok=True)
+    out = []
+    for i in range(n):
+        p = dest / ("%03d%s" % (i, src.suffix))
+        try:
+            os.link(src, p)
+        except OSError:
+            shutil.copyfile(src, p)
+        out.append(p)
+    return out
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    s = sorted(values)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": s[-1]}
+
+
+def run_previews(dd: Path, paths: List[Path], frame: str, workers: int) -> Dict[str, Any]:
+    # workers=0 renders in this process exactly as a pool worker does (timed_render_preview) and writes to the store here;
+    # otherwise a PreviewScheduler with that many worker processes. latency_ms is the decode_ms of each file in both
+    # modes (render only, without the store write). The pool is started and its workers have loaded the decoders
+    # before the clock starts: that start-up is reported as startup_seconds, not counted in files_per_sec.
+    # Previews are removed first so all files render.
+    shutil.rmtree(dd / DATA_DIR_NAME / PREVIEWS_DIR, ignore_errors=True)
+    latencies: List[float] = []
+    ok = 0
+    out: Dict[str, Any] = {"files": len(paths)}
+    store = open_preview_store(dd, "files")
+    if workers == 0:
+        try:
+            t0 = time.perf_counter()
+            for p in paths:
+                data, info = timed_render_preview(str(p), frame)
+                latencies.append(info["decode_ms"])
+                if data is not None:
+                    store.put(preview_name_for(preview_rel_path(dd, p)), data)
+                    ok += 1
+            seconds = time.perf_counter() - t0
+        finally:
+            store.close()
+    else:
+        results = []
+        sched = PreviewScheduler(dd, lambda key, name, good: results.append(good), workers, store, frame)
+        try:
+            t = time.perf_counter()
+            sched.start_workers()
+            out["startup_seconds"] = round(time.perf_counter() - t, 4)
+            t0 = time.perf_counter()
+            sched.submit(str(p.resolve()) for p in paths)
+            sched.wait()
+            seconds = time.perf_counter() - t0
+        finally:
+            sched.stop(wait=True)  # exiting workers would otherwise compete with the next row
+            store.close()
+        ok = sum(results)
+        latencies = [rec["decode_ms"] for rec in PreviewManifest(dd).entries().values() if "decode_ms" in rec]
+    out.update(
+        ok=ok,
+        seconds=seconds,
+        files_per_sec=round(len(paths) / seconds, 2) if seconds else None,
+        latency_ms={k: round(v, 2) for k, v in _percentiles(latencies).items()},
+    )
+    return out
+
+
+def _split(text: str) -> List[str]:
+    return [t.strip() for t in text.split(",") if t.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark preview generation on synthesized clips and images.")
+    parser.add_argument("--codecs", default=VIDEO_CODECS, help="FOURCC:container list (default %s)" % VIDEO_CODECS)
+    parser.add_argument("--images", default=IMAGE_FORMATS, help="Pillow format:ext list (default %s)" % IMAGE_FORMATS)
+    parser.add_argument("--resolutions", default=RESOLUTIONS, help="default %s" % RESOLUTIONS)
+    parser.add_argument("--gops", default=GOPS, help="requested keyframe intervals (default %s)" % GOPS)
+    parser.add_argument(
+        "--strategies", default=STRATEGIES, help="preview_video_frame values (default %s)" % STRATEGIES.replace("%", "%%")
+    )
+    parser.add_argument("--workers", help="worker counts, 0 = in-process (default 0,1,%d)" % default_preview_workers())
+    parser.add_argument("--copies", type=int, default=16, help="files per sample (default 16)")
+    parser.add_argument("--seconds", type=float, default=10, help="clip length (default 10)")
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--quick", action="store_true", help="one small resolution, one GOP, 4 copies, 4 s clips")
+    parser.add_argument("--dir", help="work directory (default: a temp dir, removed afterwards)")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+    if optional_import("cv2") is None or optional_import("numpy") is None or optional_import("PIL.Image") is None:
+        parser.error("needs opencv-python, numpy and pillow (pip install -r requirements.txt)")
+    if args.quick:
+        # Only replaces values left at their defaults.
+        quick = (("resolutions", RESOLUTIONS, "640x360"), ("gops", GOPS, "12"), ("copies", 16, 4), ("seconds", 10, 4))
+        for name, default, value in quick:
+            if getattr(args, name) == default:
+                setattr(args, name, value)
+    workers = list(dict.fromkeys(int(w) for w in _split(args.workers or "0,1,%d" % default_preview_workers())))
+    resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in _split(args.resolutions)]
+    frames = max(1, int(args.seconds * args.fps))
+    params = {
+        "codecs": _split(args.codecs),
+        "images": _split(args.images),
+        "resolutions": _split(args.resolutions),
+        "gops": [int(g) for g in _split(args.gops)],
+        "strategies": _split(args.strategies),
+        "workers": workers,
+        "copies": args.copies,
+        "seconds": args.seconds,
+        "fps": args.fps,
+        "cpu_count": os.cpu_count(),
+    }
+    results = result_header("previews", params)
+    cases: Dict[str, Any] = {}
+    stages: Dict[str, Any] = {}
+    root = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="preview_bench_"))
+    try:
+        samples = []
+        for w, h in resolutions:
+            for spec in params["codecs"]:
+                fourcc, ext = spec.split(":")
+                for gop in params["gops"]:
+                    name = "%s%s_%dx%d_gop%d" % (fourcc, ext, w, h, gop)
+                    log("Writing %s ..." % name)
+                    src = root / "samples" / (name + ext)
+                    src.parent.mkdir(parents=True, exist_ok=True)
+                    info = make_clip(src, fourcc, (w, h), args.fps, frames, gop)
+                    if info is None:
+                        cases[name] = {"skipped": "cannot write %s%s with this OpenCV build" % (fourcc, ext)}
+                        continue
+                    if info["gop"] is not None and info["gop"] < 0.8 * min(gop, frames):
+                        log("  %s: keyframe interval %s requested, %s written" % (name, gop, info["gop"]))
+                    samples.append((name, src, dict(info, codec=fourcc, container=ext, resolution="%dx%d" % (w, h))))
+            for spec in params["images"]:
+                fmt, ext = spec.split(":")
+                name = "%s_%dx%d" % (fmt.lower(), w, h)
+                src = root / "samples" / (name + ext)
+                src.parent.mkdir(parents=True, exist_ok=True)
+                info = make_image(src, fmt, (w, h))
+                if info is None:
+                    cases[name] = {"skipped": "Pillow cannot write %s" % fmt}
+                    continue
+                samples.append((name, src, dict(info, format=fmt, resolution="%dx%d" % (w, h))))
+        for name, src, info in samples:
+            cases[name] = info
+            dd = root / "datasets" / name
+            paths = _copies(src, dd, args.copies)
+            # Images ignore the video frame strategy.
+            strategies = params["strategies"] if "codec" in info else ["image"]
+            for strategy in strategies:
+                for n in workers:
+                    label = "inline" if n == 0 else "workers=%d" % n
+                    res = run_previews(dd, paths, strategy if "codec" in info else "keyframe", n)
+                    stages.setdefault(name, {}).setdefault(strategy, {})[label] = res
+                    log(
+                        "%-32s %-9s %-10s %7.1f files/s  p50 %s ms  start-up %s s"
+                        % (
+                            name,
+                            strategy,
+                            label,
+                            res["files_per_sec"] or 0,
+                            res["latency_ms"].get("p50"),
+                            res.get("startup_seconds", "-"),
+                        )
+                    )
+    finally:
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+    results["cases"] = cases
+    results["stages"] = stages
+    write_results(results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# benchlib.py - shared helpers for the benchmark scripts (timing, peak memory, JSON results)
+
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+
+def git_commit() -> Optional[str]:
+    # Short HEAD hash, with "+dirty" when the work tree has changes; None outside a git checkout.
+    try:
+        head = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout
+        return head + ("+dirty" if dirty.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stage(
+    fn: Callable[[], Any], repeat: int = 1, memory: bool = True, setup: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    # Times fn() repeat times (setup() before each run, untimed) and, with memory=True, runs it once more under
+    # tracemalloc for the peak of Python allocations. Timing runs are not traced, so the overhead does not skew them.
+    runs: List[float] = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    out: Dict[str, Any] = {"seconds": min(runs), "runs": [round(r, 6) for r in runs]}
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            fn()
+            out["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return out
+
+
+def result_header(benchmark: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "benchmark": benchmark,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+    }
+
+
+def write_results(results: Dict[str, Any], output: Optional[str]) -> None:
+    text = json.dumps(results, indent=2)
+    if output:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+        print("Results written to %s" % output, file=sys.stderr)
+    else:
+        print(text)
+
+
+def log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
@@ -0,0 +1,65 @@
+# compare.py - compare two benchmark result files (bench_core.py / bench_previews.py output)
+# Run: python bench/compare.py base.json new.json [--threshold 1.2]
+# Exit status 1 when a stage got slower (or used more memory) than threshold x base.
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+METRICS = (("seconds", "time"), ("peak_bytes", "peak"), ("files_per_sec", "files/s"), ("startup_seconds", "start-up"))
+
+
+def _flatten(stages: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    # Stage results may nest (previews: sample -> strategy -> workers); leaves hold the metrics.
+    for name, value in stages.items():
+        if not isinstance(value, dict):
+            continue
+        if any(m in value for m, _ in METRICS) or "skipped" in value:
+            yield prefix + name, value
+        else:
+            yield from _flatten(value, prefix + name + "/")
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> Tuple[List[str], bool]:
+    lines = ["%-48s %-8s %14s %14s %8s" % ("stage", "metric", "base", "new", "ratio")]
+    worse = False
+    base_stages = dict(_flatten(base.get("stages", {})))
+    for name, res in _flatten(new.get("stages", {})):
+        old = base_stages.get(name)
+        if old is None or "skipped" in res or "skipped" in old:
+            lines.append("%-48s %s" % (name, "skipped" if old is not None else "new"))
+            continue
+        for metric, label in METRICS:
+            if metric not in res or metric not in old or not old[metric]:
+                continue
+            ratio = res[metric] / old[metric]
+            # Higher is better for throughput: compare the inverse so "bad" always means a larger ratio.
+            bad = (1 / ratio if metric == "files_per_sec" and ratio else ratio) > threshold
+            worse = worse or bad
+            mark = "  <--" if bad else ""
+            lines.append("%-48s %-8s %14.4g %14.4g %7.2fx%s" % (name, label, old[metric], res[metric], ratio, mark))
+    return lines, worse
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2, help="flag stages worse than this ratio (default 1.2)")
+    args = parser.parse_args(argv)
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    for label, res in (("base", base), ("new", new)):
+        print("%-4s %s (%s)" % (label, res.get("commit"), res.get("timestamp")))
+    if base.get("params") != new.get("params"):
+        print("warning: parameters differ")
+    lines, worse = compare(base, new, args.threshold)
+    print("\n".join(lines))
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# synth.py - synthetic dataset trees for the benchmarks
+# Run: python bench/synth.py DIR --files 100000 [--depth 3 --fanout 10 --tags 500 ...]
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import benchlib  # noqa: F401 - puts src/ on sys.path
+from dataset_core import DATA_DIR_NAME, METADATA_FILENAME
+
+SYNTH_PARAMS_FILENAME = "synth_params.json"
+SYNTH_DEFAULTS: Dict[str, Any] = {
+    "files": 10000,
+    "depth": 2,
+    "fanout": 10,
+    "tags": 200,
+    "max_tags_per_file": 4,
+    "zipf": 1.1,
+    "untagged_ratio": 0.1,
+    "notes_ratio": 0.2,
+    "note_len": 40,
+    "video_ratio": 0.5,
+    "seed": 0,
+}
+
+
+def _leaf_dirs(depth: int, fanout: int):
+    dirs = [""]
+    for _ in range(depth):
+        dirs = [os.path.join(d, "d%02d" % i) for d in dirs for i in range(fanout)]
+    return dirs
+
+
+def make_synthetic_dataset(root: Path, **params) -> Dict[str, Any]:
+    # Creates root with `files` empty media files spread evenly over fanout**depth leaf folders, plus
+    # .data/video_metadata.json: tags drawn from a Zipf(zipf) distribution over `tags` names (0..max_tags_per_file
+    # per file, untagged_ratio with none), notes of about note_len characters on notes_ratio of the files.
+    # An existing tree made with the same parameters is reused (making 1M files takes a while); any other non-empty
+    # directory is refused. Returns the params.
+    p = dict(SYNTH_DEFAULTS, **{k: v for k, v in params.items() if v is not None})
+    params_path = root / DATA_DIR_NAME / SYNTH_PARAMS_FILENAME
+    try:
+        if json.loads(params_path.read_text(encoding="utf-8")) == p:
+            return p
+    except (OSError, ValueError):
+        pass
+    if root.exists() and any(root.iterdir()):
+        raise ValueError("%s is not empty and was not made with these parameters; use a new directory" % root)
+    rng = random.Random(p["seed"])
+    names = ["tag%04d" % i for i in range(p["tags"])]
+    cum = list(accumulate(1.0 / (i + 1) ** p["zipf"] for i in range(p["tags"])))
+    leaves = _leaf_dirs(p["depth"], p["fanout"])
+    for d in leaves:
+        (root / d).mkdir(parents=True, exist_ok=True)
+    metadata = {}
+    letters = string.ascii_lowercase + " "
+    for i in range(p["files"]):
+        ext = ".mp4" if rng.random() < p["video_ratio"] else ".jpg"
+        rel = os.path.join(leaves[i % len(leaves)], "f%07d%s" % (i, ext))
+        open(root / rel, "wb").close()
+        tags = []
+        if names and rng.random() >= p["untagged_ratio"]:
+            tags = list(dict.fromkeys(rng.choices(names, cum_weights=cum, k=rng.randint(1, p["max_tags_per_file"]))))
+        notes = ""
+        if rng.random() < p["notes_ratio"]:
+            n = max(1, int(rng.gauss(p["note_len"], p["note_len"] / 4)))
+            notes = "".join(rng.choices(letters, k=n)).strip()
+        if tags or notes:
+            metadata[rel] = {"tags": "; ".join(tags), "notes": notes}
+    data_dir = root / DATA_DIR_NAME
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(data_dir / METADATA_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    params_path.write_text(json.dumps(p), encoding="utf-8")
+    return p
+
+
+def add_synth_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--files", type=int, help="number of media files (default %d)" % SYNTH_DEFAULTS["files"])
+    parser.add_argument("--depth", type=int, help="folder depth (default %d)" % SYNTH_DEFAULTS["depth"])
+    parser.add_argument("--fanout", type=int, help="subfolders per folder (default %d)" % SYNTH_DEFAULTS["fanout"])
+    parser.add_argument("--tags", type=int, help="tag vocabulary size (default %d)" % SYNTH_DEFAULTS["tags"])
+    parser.add_argument("--max-tags-per-file", type=int, help="default %d" % SYNTH_DEFAULTS["max_tags_per_file"])
+    parser.add_argument("--zipf", type=float, help="tag popularity skew (default %s)" % SYNTH_DEFAULTS["zipf"])
+    parser.add_argument("--untagged-ratio", type=float, help="default %s" % SYNTH_DEFAULTS["untagged_ratio"])
+    parser.add_argument("--notes-ratio", type=float, help="default %s" % SYNTH_DEFAULTS["notes_ratio"])
+    parser.add_argument("--note-len", type=int, help="mean note length (default %d)" % SYNTH_DEFAULTS["note_len"])
+    parser.add_argument("--video-ratio", type=float, help="share of videos (default %s)" % SYNTH_DEFAULTS["video_ratio"])
+    parser.add_argument("--seed", type=int, help="default %d" % SYNTH_DEFAULTS["seed"])
+
+
+def synth_params(args) -> Dict[str, Optional[Any]]:
+    return {k: getattr(args, k) for k in SYNTH_DEFAULTS if hasattr(args, k)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Create a synthetic dataset tree.")
+    parser.add_argument("dir", help="dataset directory to create")
+    add_synth_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(make_synthetic_dataset(Path(args.dir), **synth_params(args))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# dataset_cli.py - Command-line interface for headless use (build servers, data pipelines)
+# Output: one JSON object per line on stdout; progress and errors go to stderr.
+# Run: python dataset_cli.py --help  or  python dataset_cli.py <command> DATASET_DIR ...
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from dataset_core import (
+    DEFAULT_SETTINGS,
+    PreviewScheduler,
+    TagIndex,
+    TagQueryError,
+    collect_orphans,
+    default_preview_workers,
+    find_orphans,
+    list_history_versions,
+    load_metadata,
+    load_settings,
+    merge_with_video_list,
+    normalize_tags,
+    open_preview_store,
+    prune_history,
+    save_metadata,
+    scan_media,
+    split_tags,
+    summarize_preview_timings,
+)
+
+
+class CliError(Exception):
+    pass
+
+
+def _emit(rec: Dict[str, Any], flush: bool = False) -> None:
+    sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    if flush:
+        sys.stdout.flush()
+
+
+def _log(msg: str) -> None:
+    print(msg, file=sys.stderr)
+
+
+def _dataset_dir(args) -> Path:
+    dd = Path(args.dataset_dir)
+    if not dd.is_dir():
+        raise CliError("Not a directory: %s" % dd)
+    return dd
+
+
+def _file_record(dd: Path, key: str, entry: Dict[str, str], relative: bool) -> Dict[str, Any]:
+    path = key
+    if relative:
+        try:
+            path = str(Path(key).relative_to(dd.resolve()))
+        except ValueError:
+            pass
+    return {"path": path, "tags": list(split_tags(entry.get("tags"))), "notes": entry.get("notes") or ""}
+
+
+def _scan(dd: Path, use_cache: bool = True, metadata: Optional[Dict[str, Dict[str, str]]] = None):
+    # Files on disk merged with their metadata, as the GUI shows them.
+    paths = scan_media(dd, use_cache=use_cache)
+    return merge_with_video_list(paths, load_metadata(dd) if metadata is None else metadata)
+
+
+def _query_keys(metadata: Dict[str, Dict[str, str]], query: Optional[str]) -> List[str]:
+    if not query:
+        return sorted(metadata)
+    try:
+        return sorted(TagIndex(metadata).query(query))
+    except TagQueryError as ex:
+        raise CliError("Invalid tag query: %s" % ex)
+
+
+def _read_targets(dd: Path, paths: List[str]) -> List[str]:
+    # Paths from the command line; "-" reads stdin: plain paths or JSON lines with a "path" field (e.g. query output).
+    out = []
+    for p in paths:
+        lines: Iterable[str] = sys.stdin if p == "-" else [p]
+        for n, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    line = json.loads(line)["path"]
+                    if not isinstance(line, str):
+                        raise TypeError("\"path\" is not a string")
+                except (ValueError, KeyError, TypeError) as ex:
+                    raise CliError("line %d: not a path or JSON record with a \"path\" field (%s)" % (n, ex))
+            path = Path(line)
+            out.append(str((path if path.is_absolute() else dd / path).resolve()))
+    return out
+
+
+# --- commands ---
+def cmd_scan(args) -> int:
+    dd = _dataset_dir(args)
+    metadata = _scan(dd, use_cache=not args.no_cache)
+    for key in sorted(metadata):
+        _emit(_file_record(dd, key, metadata[key], args.relative))
+    _log("%d file(s)" % len(metadata))
+    return 0
+
+
+def cmd_query(args) -> int:
+    dd = _dataset_dir(args)
+    metadata = _scan(dd)
+    keys = _query_keys(metadata, args.query)
+    for key in keys:
+        _emit(_file_record(dd, key, metadata[key], args.relative))
+    _log("%d of %d file(s) match" % (len(keys), len(metadata)))
+    return 0
+
+
+def cmd_tag(args) -> int:
+    dd = _dataset_dir(args)
+    tags = split_tags(normalize_tags(" ".join(args.tags)))
+    if not tags:
+        raise CliError("No tags given")
+    metadata = load_metadata(dd)
+    if args.query is not None:
+        targets = _query_keys(_scan(dd, metadata=metadata), args.query)
+    else:
+        targets = _read_targets(dd, args.paths)
+    dirty = set()
+    for key in targets:
+        entry = metadata.get(key)
+        if entry is None:
+            if not Path(key).is_file():
+                _log("Skipped (not found): %s" % key)
+                continue
+            entry = {"tags": "", "notes": ""}
+        old = split_tags(entry.get("tags"))
+        if args.action == "add":
+            new = old + tuple(t for t in tags if t not in old)
+        else:
+            new = tuple(t for t in old if t not in tags)
+        if new == old:
+            continue
+        metadata[key] = dict(entry, tags="; ".join(new))
+        dirty.add(key)
+        _emit(_file_record(dd, key, metadata[key], args.relative))
+    if dirty and not args.dry_run:
+        save_metadata(dd, metadata, dirty=dirty)
+    _log("%s %d file(s)" % ("Would change" if args.dry_run else "Changed", len(dirty)))
+    return 0
+
+
+def cmd_export(args) -> int:
+    # Same format as the GUI export: one absolute path per line.
+    dd = _dataset_dir(args)
+    keys = _query_keys(_scan(dd), args.query)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for key in keys:
+            out.write(key + "\n")
+    finally:
+        if args.output:
+            out.close()
+    _log("Exported %d path(s)" % len(keys))
+    return 0
+
+
+def cmd_previews(args) -> int:
+    dd = _dataset_dir(args)
+    if args.timings:
+        for codec, stats in summarize_preview_timings(dd).items():
+            _emit(dict(codec=codec, **stats))
+        return 0
+    keys = [str(p.resolve()) for p in scan_media(dd, use_cache=True)]
+    failed = []
+    store = open_preview_store(dd)
+
+    def on_done(key: str, name: str, ok: bool):
+        # Pool threads: one write per line keeps records whole.
+        if not ok:
+            failed.append(key)
+        _emit({"path": key, "preview": name, "ok": ok}, flush=True)
+
+    sched = PreviewScheduler(dd, on_done, workers=args.workers, store=store, frame=args.frame)
+    try:
+        sched.submit(keys)
+        sched.wait()
+    except KeyboardInterrupt:
+        _log("Interrupted")
+        return 130
+    finally:
+        sched.stop()
+        store.close()
+    _log("%d file(s) checked, %d failed" % (len(keys), len(failed)))
+    return 1 if failed else 0
+
+
+def cmd_history(args) -> int:
+    dd = _dataset_dir(args)
+    if args.action == "list":
+        for version, kind, path in list_history_versions(dd):
+            _emit({"version": version, "kind": kind, "bytes": path.stat().st_size})
+        return 0
+    settings = load_settings(dd)
+    keep_all = args.keep_all_days if args.keep_all_days is not None else settings.get("history_keep_all_days")
+    keep_daily = args.keep_daily_days if args.keep_daily_days is not None else settings.get("history_keep_daily_days")
+    removed = prune_history(dd, keep_all, keep_daily)
+    for version in removed:
+        _emit({"removed": version})
+    _log("Removed %d version(s)" % len(removed))
+    return 0
+
+
+def cmd_gc(args) -> int:
+    dd = _dataset_dir(args)
+    store = open_preview_store(dd)
+    try:
+        report = find_orphans(dd, store=store)
+        for name in report["previews"]:
+            _emit({"kind": "preview", "name": name})
+        for name in report["manifest"]:
+            _emit({"kind": "manifest", "name": name})
+        for key in report["metadata"]:
+            _emit({"kind": "metadata", "path": key})
+        if args.dry_run:
+            return 0
+        dest = collect_orphans(dd, report, archive=args.archive, store=store)
+    finally:
+        store.close()
+    n = len(report["previews"]) + len(report["manifest"]) + len(report["metadata"])
+    _log("Removed %d orphan(s), %d preview byte(s)%s" % (n, report["preview_bytes"], " -> %s" % dest if dest else ""))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="dataset_cli", description="Dataset Video Manager command-line interface.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("dataset_dir", help="dataset directory")
+    listing = argparse.ArgumentParser(add_help=False)
+    listing.add_argument("--relative", action="store_true", help="print paths relative to the dataset directory")
+
+    p = sub.add_parser("scan", parents=[common, listing], help="rescan media files; one record per file")
+    p.add_argument("--no-cache", action="store_true", help="ignore the directory scan cache")
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("query", parents=[common, listing], help="files matching a tag query")
+    p.add_argument("query", help='tag query, e.g. "train AND NOT synth*"')
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("tag", help="add or remove tags on many files")
+    tag_sub = p.add_subparsers(dest="action", required=True)
+    for action in ("add", "remove"):
+        tp = tag_sub.add_parser(action, parents=[common, listing], help="%s tags" % action)
+        tp.add_argument("tags", nargs="+", help="tags (separated by spaces, ; or ,)")
+        target = tp.add_mutually_exclusive_group(required=True)
+        target.add_argument("--paths", nargs="+", help="files to change; - reads paths or query output from stdin")
+        target.add_argument("--query", help="change every file matching this tag query")
+        tp.add_argument("--dry-run", action="store_true", help="print the changes without saving")
+        tp.set_defaults(func=cmd_tag)
+
+    p = sub.add_parser("export", parents=[common], help="absolute paths of files matching a query, one per line")
+    p.add_argument("--query", help="tag query (default: all files)")
+    p.add_argument("-o", "--output", help="write to this file instead of stdout")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("previews", parents=[common], help="generate missing previews")
+    p.add_argument(
+        "-j", "--workers", type=int, help="worker processes (default: %d on this machine)" % default_preview_workers()
+    )
+    p.add_argument("--frame", help='video frame: "keyframe", "<seconds>s" or "<percent>%%" (default: settings)')
+    p.add_argument("--timings", action="store_true", help="print recorded decode times per codec instead")
+    p.set_defaults(func=cmd_previews)
+
+    p = sub.add_parser("history", help="list or prune metadata history versions")
+    hist_sub = p.add_subparsers(dest="action", required=True)
+    hp = hist_sub.add_parser("list", parents=[common], help="list versions, oldest first")
+    hp.set_defaults(func=cmd_history)
+    hp = hist_sub.add_parser("prune", parents=[common], help="apply the retention policy")
+    hp.add_argument(
+        "--keep-all-days", type=float, help="default: settings (%s)" % DEFAULT_SETTINGS["history_keep_all_days"]
+    )
+    hp.add_argument(
+        "--keep-daily-days", type=float, help="default: settings (%s)" % DEFAULT_SETTINGS["history_keep_daily_days"]
+    )
+    hp.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("gc", parents=[common], help="remove previews and metadata of files that no longer exist")
+    p.add_argument("--archive", action="store_true", help="move them to .data/gc_archive/ instead of deleting")
+    p.add_argument("--dry-run", action="store_true", help="only list what would be removed")
+    p.set_defaults(func=cmd_gc)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except CliError as ex:
+        _log("dataset_cli: error: %s" % ex)
+        return 1
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); silence the flush at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
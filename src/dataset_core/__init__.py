@@ -0,0 +1,211 @@
+# dataset_core - headless core of the Dataset Video Manager: metadata, scanning, tags, watchers, previews.
+# Imports no GUI toolkit; cv2 / PIL are loaded on first use (see previews.optional_import).
+
+from .metadata import (
+    DATA_DIR_NAME,
+    DEFAULT_SETTINGS,
+    HISTORY_CHECKPOINT_EVERY,
+    HISTORY_DIR_NAME,
+    METADATA_DB_FILENAME,
+    METADATA_FILENAME,
+    METADATA_JOURNAL_COMPACT_MIN_BYTES,
+    METADATA_JOURNAL_COMPACT_RATIO,
+    METADATA_JOURNAL_FILENAME,
+    SETTINGS_FILENAME,
+    export_metadata_from_sqlite,
+    get_metadata_backend,
+    get_metadata_store_path,
+    import_metadata_to_sqlite,
+    list_history_versions,
+    load_history_version,
+    load_metadata,
+    load_settings,
+    merge_with_video_list,
+    prune_history,
+    restore_history_version,
+    save_metadata,
+    to_rel_metadata,
+    write_json_atomic,
+)
+from .tags import (
+    TagIndex,
+    TagQuery,
+    TagQueryError,
+    count_tags_in_metadata,
+    evaluate_tag_query,
+    get_all_tags,
+    normalize_tags,
+    parse_tag_query,
+    split_tags,
+)
+from .scan import (
+    IMAGE_EXTENSIONS,
+    MEDIA_EXTENSIONS,
+    SCAN_CACHE_FILENAME,
+    SCAN_CACHE_RACY_NS,
+    SCAN_CACHE_VERSION,
+    VIDEO_EXTENSIONS,
+    is_scan_excluded,
+    load_scan_cache,
+    save_scan_cache,
+    scan_media,
+)
+from .watch import (
+    IN_CLOEXEC,
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_DELETE_SELF,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_NONBLOCK,
+    IN_ONLYDIR,
+    IN_Q_OVERFLOW,
+    InotifyWatcher,
+    PollingWatcher,
+    REMOTE_FILESYSTEMS,
+    WATCH_POLL_SECONDS,
+    WatchChange,
+    create_watcher,
+)
+from .jobs import Generation, JobManager
+from .previews import (
+    DirPreviewStore,
+    PREVIEWS_DIR,
+    PREVIEW_EXT,
+    PREVIEW_MANIFEST_FILENAME,
+    PREVIEW_MAX_DECODE_PIXELS,
+    PREVIEW_MAX_SIZE,
+    PREVIEW_PACK_COMPACT_RATIO,
+    PREVIEW_PACK_FILENAME,
+    PREVIEW_PACK_INDEX_FILENAME,
+    PREVIEW_PACK_LOCK_FILENAME,
+    PREVIEW_PRIORITY_NEIGHBOR,
+    PREVIEW_PRIORITY_REST,
+    PREVIEW_PRIORITY_SELECTED,
+    PREVIEW_PRIORITY_VISIBLE,
+    PackPreviewStore,
+    PreviewImageCache,
+    PreviewManifest,
+    PreviewScheduler,
+    decode_preview,
+    default_preview_workers,
+    generate_one_preview,
+    generate_stored_preview,
+    get_preview_path,
+    has_preview_backend,
+    open_preview_store,
+    optional_import,
+    parse_frame_strategy,
+    preview_name_for,
+    preview_rel_path,
+    render_preview,
+    summarize_preview_timings,
+    timed_render_preview,
+)
+from .orphans import GC_ARCHIVE_DIR_NAME, collect_orphans, find_orphans
+from .index import DatasetIndex
+
+__all__ = [
+    "DATA_DIR_NAME",
+    "DEFAULT_SETTINGS",
+    "HISTORY_CHECKPOINT_EVERY",
+    "HISTORY_DIR_NAME",
+    "METADATA_DB_FILENAME",
+    "METADATA_FILENAME",
+    "METADATA_JOURNAL_COMPACT_MIN_BYTES",
+    "METADATA_JOURNAL_COMPACT_RATIO",
+    "METADATA_JOURNAL_FILENAME",
+    "SETTINGS_FILENAME",
+    "export_metadata_from_sqlite",
+    "get_metadata_backend",
+    "get_metadata_store_path",
+    "import_metadata_to_sqlite",
+    "list_history_versions",
+    "load_history_version",
+    "load_metadata",
+    "load_settings",
+    "merge_with_video_list",
+    "prune_history",
+    "restore_history_version",
+    "save_metadata",
+    "to_rel_metadata",
+    "write_json_atomic",
+    "TagIndex",
+    "TagQuery",
+    "TagQueryError",
+    "count_tags_in_metadata",
+    "evaluate_tag_query",
+    "get_all_tags",
+    "normalize_tags",
+    "parse_tag_query",
+    "split_tags",
+    "IMAGE_EXTENSIONS",
+    "MEDIA_EXTENSIONS",
+    "SCAN_CACHE_FILENAME",
+    "SCAN_CACHE_RACY_NS",
+    "SCAN_CACHE_VERSION",
+    "VIDEO_EXTENSIONS",
+    "is_scan_excluded",
+    "load_scan_cache",
+    "save_scan_cache",
+    "scan_media",
+    "IN_CLOEXEC",
+    "IN_CLOSE_WRITE",
+    "IN_CREATE",
+    "IN_DELETE",
+    "IN_DELETE_SELF",
+    "IN_IGNORED",
+    "IN_ISDIR",
+    "IN_MOVED_FROM",
+    "IN_MOVED_TO",
+    "IN_NONBLOCK",
+    "IN_ONLYDIR",
+    "IN_Q_OVERFLOW",
+    "InotifyWatcher",
+    "PollingWatcher",
+    "REMOTE_FILESYSTEMS",
+    "WATCH_POLL_SECONDS",
+    "WatchChange",
+    "create_watcher",
+    "Generation",
+    "JobManager",
+    "DirPreviewStore",
+    "PREVIEWS_DIR",
+    "PREVIEW_EXT",
+    "PREVIEW_MANIFEST_FILENAME",
+    "PREVIEW_MAX_DECODE_PIXELS",
+    "PREVIEW_MAX_SIZE",
+    "PREVIEW_PACK_COMPACT_RATIO",
+    "PREVIEW_PACK_FILENAME",
+    "PREVIEW_PACK_INDEX_FILENAME",
+    "PREVIEW_PACK_LOCK_FILENAME",
+    "PREVIEW_PRIORITY_NEIGHBOR",
+    "PREVIEW_PRIORITY_REST",
+    "PREVIEW_PRIORITY_SELECTED",
+    "PREVIEW_PRIORITY_VISIBLE",
+    "PackPreviewStore",
+    "PreviewImageCache",
+    "PreviewManifest",
+    "PreviewScheduler",
+    "decode_preview",
+    "default_preview_workers",
+    "generate_one_preview",
+    "generate_stored_preview",
+    "get_preview_path",
+    "has_preview_backend",
+    "open_preview_store",
+    "optional_import",
+    "parse_frame_strategy",
+    "preview_name_for",
+    "preview_rel_path",
+    "render_preview",
+    "summarize_preview_timings",
+    "timed_render_preview",
+    "GC_ARCHIVE_DIR_NAME",
+    "collect_orphans",
+    "find_orphans",
+    "DatasetIndex",
+]
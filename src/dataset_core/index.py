@@ -0,0 +1,124 @@
+# dataset_core/index.py - read-only DatasetIndex for training pipelines
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .metadata import load_metadata, merge_with_video_list
+from .scan import scan_media
+from .tags import evaluate_tag_query, split_tags
+
+
+class DatasetIndex:
+    # Read-only view of a dataset's metadata. Rows are the metadata keys (absolute paths) in sorted order, so
+    # iteration and sharding are the same in every process. Tags are interned to integer ids; each tag keeps the set
+    # of row ids carrying it, so lookups by path or tag are O(1) and queries are set operations.
+    # Plain containers only: the index pickles cheaply into DataLoader worker processes.
+    def __init__(self, metadata: Dict[str, Dict[str, str]]):
+        self._keys: List[str] = sorted(metadata)
+        self._rows: Dict[str, int] = {k: i for i, k in enumerate(self._keys)}
+        self._tag_ids: Dict[str, int] = {}
+        self._tag_names: List[str] = []
+        self._tag_rows: List[Set[int]] = []
+        self._row_tags: List[Tuple[int, ...]] = []
+        self._notes: Dict[int, str] = {}
+        for row, key in enumerate(self._keys):
+            entry = metadata[key]
+            ids = []
+            for tag in split_tags(entry.get("tags")):
+                tid = self._tag_ids.get(tag)
+                if tid is None:
+                    tid = self._tag_ids[tag] = len(self._tag_names)
+                    self._tag_names.append(tag)
+                    self._tag_rows.append(set())
+                self._tag_rows[tid].add(row)
+                ids.append(tid)
+            self._row_tags.append(tuple(ids))
+            if entry.get("notes"):
+                self._notes[row] = entry["notes"]
+        self._lower: Dict[str, List[int]] = {}
+        for tid, tag in enumerate(self._tag_names):
+            self._lower.setdefault(tag.lower(), []).append(tid)
+
+    @classmethod
+    def load(cls, dataset_dir: Path, on_disk: bool = False) -> "DatasetIndex":
+        # on_disk=True keeps only media files that currently exist (a scan, as the GUI shows them); otherwise every
+        # metadata entry is indexed. Nothing is written: the scan cache is read but not saved.
+        metadata = load_metadata(dataset_dir)
+        if on_disk:
+            paths = scan_media(dataset_dir, use_cache=True, write_cache=False)
+            metadata = merge_with_video_list(paths, metadata)
+        return cls(metadata)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, path: Any) -> bool:
+        return str(path) in self._rows
+
+    def __iter__(self) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        return self.iter_items()
+
+    @property
+    def paths(self) -> List[str]:
+        return self._keys
+
+    def tags(self) -> List[str]:
+        # Tag names indexed by tag id.
+        return self._tag_names
+
+    def tag_id(self, tag: str) -> Optional[int]:
+        return self._tag_ids.get(tag)
+
+    def tag_name(self, tag_id: int) -> str:
+        return self._tag_names[tag_id]
+
+    def tag_ids_of(self, path: Any) -> Tuple[int, ...]:
+        row = self._rows.get(str(path))
+        return () if row is None else self._row_tags[row]
+
+    def tags_of(self, path: Any) -> Tuple[str, ...]:
+        return tuple(self._tag_names[t] for t in self.tag_ids_of(path))
+
+    def notes_of(self, path: Any) -> str:
+        row = self._rows.get(str(path))
+        return "" if row is None else self._notes.get(row, "")
+
+    def has_tag(self, path: Any, tag: str) -> bool:
+        row, tid = self._rows.get(str(path)), self._tag_ids.get(tag)
+        return row is not None and tid is not None and row in self._tag_rows[tid]
+
+    def count(self, tag: str) -> int:
+        tid = self._tag_ids.get(tag)
+        return 0 if tid is None else len(self._tag_rows[tid])
+
+    def counts(self) -> Counter:
+        return Counter({tag: len(self._tag_rows[tid]) for tid, tag in enumerate(self._tag_names)})
+
+    def keys_for(self, tag: str) -> Set[str]:
+        tid = self._tag_ids.get(tag)
+        return set() if tid is None else {self._keys[r] for r in self._tag_rows[tid]}
+
+    def query_rows(self, query: Any) -> List[int]:
+        # query: TagQuery or query text (same syntax as the GUI filter); sorted row ids.
+        all_rows = lambda: set(range(len(self._keys)))
+        return sorted(evaluate_tag_query(query, self._lower, self._tag_rows.__getitem__, all_rows, set))
+
+    def query(self, query: Any) -> List[str]:
+        return [self._keys[r] for r in self.query_rows(query)]
+
+    def iter_items(
+        self, query: Any = None, rank: int = 0, world_size: int = 1
+    ) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        # Lazily yields (path, tags) for the rows matching query (default: all), taking every world_size-th row
+        # starting at rank: shards are disjoint, cover every row and differ in size by at most one.
+        if world_size < 1 or not 0 <= rank < world_size:
+            raise ValueError("Need 0 <= rank < world_size, got rank=%r world_size=%r" % (rank, world_size))
+        rows = range(len(self._keys)) if query is None else self.query_rows(query)
+        names = self._tag_names
+        for row in rows[rank::world_size]:
+            yield self._keys[row], tuple(names[t] for t in self._row_tags[row])
+
+    def shard(self, rank: int, world_size: int, query: Any = None) -> List[str]:
+        # Paths of one shard (see iter_items).
+        return [path for path, _ in self.iter_items(query, rank, world_size)]
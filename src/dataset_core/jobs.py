@@ -0,0 +1,57 @@
+# dataset_core/jobs.py - generation tokens for cancellable background work
+
+import threading
+from typing import Any, Callable, List, Optional
+
+
+class Generation(threading.Event):
+    # Token for one directory load. It doubles as the cancel flag: background work polls is_set() and winds down.
+    def __init__(self, number: int):
+        super().__init__()
+        self.number = number
+
+
+class JobManager:
+    # Hands out one Generation per load. Starting a new generation cancels the previous one and runs the cleanup
+    # callbacks registered on it, so stale scan / preview work stops while the new work starts right away.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[Generation] = None
+        self._number = 0
+        self._cleanups: List[Callable[[], None]] = []
+
+    def new_generation(self) -> Generation:
+        self.cancel()
+        with self._lock:
+            self._number += 1
+            self._current = Generation(self._number)
+            return self._current
+
+    def current(self) -> Optional[Generation]:
+        return self._current
+
+    def is_current(self, gen: Optional[Generation]) -> bool:
+        return gen is not None and gen is self._current and not gen.is_set()
+
+    def cancel(self):
+        with self._lock:
+            gen, cleanups, self._cleanups = self._current, self._cleanups, []
+        if gen is None:
+            return
+        gen.set()
+        for fn in cleanups:
+            fn()
+
+    def on_cancel(self, gen: Generation, fn: Callable[[], None]):
+        # Runs fn when gen is cancelled (right away if it already is).
+        with self._lock:
+            if self.is_current(gen):
+                self._cleanups.append(fn)
+                return
+        fn()
+
+    def spawn(self, gen: Generation, target: Callable[..., Any], *args) -> threading.Thread:
+        # target(gen, *args) on a daemon thread.
+        t = threading.Thread(target=target, args=(gen,) + args, daemon=True)
+        t.start()
+        return t
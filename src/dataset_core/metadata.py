@@ -0,0 +1,510 @@
+# dataset_core/metadata.py - metadata store (JSON + journal or SQLite), history versions, settings
+
+import gzip
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# --- metadata (was metadata_store) ---
+DATA_DIR_NAME = ".data"
+METADATA_FILENAME = "video_metadata.json"
+METADATA_DB_FILENAME = "video_metadata.sqlite3"
+METADATA_JOURNAL_FILENAME = "video_metadata.journal.jsonl"
+# The journal is folded into video_metadata.json once it grows past this fraction of the main file (or the minimum).
+METADATA_JOURNAL_COMPACT_RATIO = 0.25
+METADATA_JOURNAL_COMPACT_MIN_BYTES = 256 * 1024
+HISTORY_DIR_NAME = "history"
+
+
+def _get_metadata_path(dataset_dir: Path) -> Path:
+    return dataset_dir / DATA_DIR_NAME / METADATA_FILENAME
+
+
+def _get_metadata_db_path(dataset_dir: Path) -> Path:
+    return dataset_dir / DATA_DIR_NAME / METADATA_DB_FILENAME
+
+
+def get_metadata_backend(dataset_dir: Path) -> str:
+    # "auto" (default) picks SQLite once .data/video_metadata.sqlite3 exists, e.g. after import_metadata_to_sqlite.
+    backend = load_settings(dataset_dir).get("metadata_backend") or "auto"
+    if backend == "auto":
+        return "sqlite" if _get_metadata_db_path(dataset_dir).exists() else "json"
+    return backend
+
+
+def get_metadata_store_path(dataset_dir: Path) -> Path:
+    if get_metadata_backend(dataset_dir) == "sqlite":
+        return _get_metadata_db_path(dataset_dir)
+    return _get_metadata_path(dataset_dir)
+
+
+def to_rel_metadata(dataset_dir: Path, data: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    dataset_resolved = dataset_dir.resolve()
+    out = {}
+    for full_path_str, value in data.items():
+        p = Path(full_path_str)
+        try:
+            rel = p.relative_to(dataset_resolved)
+        except ValueError:
+            rel = p
+        out[str(rel)] = value
+    return out
+
+
+def _from_rel_metadata(dataset_dir: Path, items: Iterable[Tuple[str, Any, Any]]) -> Dict[str, Dict[str, str]]:
+    out = {}
+    dataset_resolved = dataset_dir.resolve()
+    for rel_key, tags, notes in items:
+        full_path = (dataset_resolved / rel_key).resolve()
+        out[str(full_path)] = {"tags": tags or "", "notes": notes or ""}
+    return out
+
+
+def _read_metadata_json(path: Path) -> Dict[str, Dict[str, str]]:
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {k: v for k, v in data.items() if isinstance(v, dict)}
+
+
+# Journal (JSON backend): saves with a known dirty set append one line per changed entry instead of rewriting
+# video_metadata.json. The first line records the main file's (size, mtime_ns); if the main file was rewritten
+# since (compaction, manual rollback), the journal is stale and ignored.
+def _get_journal_path(dataset_dir: Path) -> Path:
+    return dataset_dir / DATA_DIR_NAME / METADATA_JOURNAL_FILENAME
+
+
+def _file_signature(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _replay_journal(dataset_dir: Path, data: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    path = _get_journal_path(dataset_dir)
+    if not path.exists():
+        return data
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return data
+    try:
+        header = json.loads(lines[0]) if lines else None
+    except json.JSONDecodeError:
+        header = None
+    if not isinstance(header, dict) or header.get("base") != _file_signature(_get_metadata_path(dataset_dir)):
+        return data
+    for line in lines[1:]:
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            break  # torn last line after a crash
+        if rec.get("deleted"):
+            data.pop(rec["path"], None)
+        else:
+            data[rec["path"]] = {"tags": rec.get("tags", ""), "notes": rec.get("notes", "")}
+    return data
+
+
+def _append_journal(dataset_dir: Path, records: Dict[str, Optional[Dict[str, str]]]) -> int:
+    path = _get_journal_path(dataset_dir)
+    header = None
+    if not path.exists():
+        header = {"base": _file_signature(_get_metadata_path(dataset_dir))}
+    with open(path, "a", encoding="utf-8") as f:
+        if header is not None:
+            f.write(json.dumps(header) + "\n")
+        for rel, v in records.items():
+            if v is None:
+                rec = {"path": rel, "deleted": True}
+            else:
+                rec = {"path": rel, "tags": v.get("tags", "") or "", "notes": v.get("notes", "") or ""}
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def _load_rel_metadata_json(dataset_dir: Path) -> Dict[str, Dict[str, str]]:
+    return _replay_journal(dataset_dir, _read_metadata_json(_get_metadata_path(dataset_dir)))
+
+
+def _rel_dirty_records(
+    dataset_dir: Path, data: Dict[str, Dict[str, str]], dirty: Iterable[str]
+) -> Dict[str, Optional[Dict[str, str]]]:
+    # rel key -> new value, or None when the entry was removed from data.
+    return to_rel_metadata(dataset_dir, {k: data.get(k) for k in dirty})
+
+
+def load_metadata(dataset_dir: Path) -> Dict[str, Dict[str, str]]:
+    if get_metadata_backend(dataset_dir) == "sqlite":
+        return _load_metadata_sqlite(dataset_dir)
+    data = _load_rel_metadata_json(dataset_dir)
+    return _from_rel_metadata(dataset_dir, ((k, v.get("tags", ""), v.get("notes", "")) for k, v in data.items()))
+
+
+def save_metadata(dataset_dir: Path, data: Dict[str, Dict[str, str]], dirty: Optional[Iterable[str]] = None) -> None:
+    # data is always the full in-memory metadata. dirty=None rewrites everything; otherwise only the given
+    # (absolute) keys are written (absent from data = deleted), and an empty set is a no-op.
+    if dirty is not None:
+        records = _rel_dirty_records(dataset_dir, data, dirty)
+        if not records:
+            return
+    data_dir = dataset_dir / DATA_DIR_NAME
+    data_dir.mkdir(parents=True, exist_ok=True)
+    full = lambda: to_rel_metadata(dataset_dir, data)
+    if get_metadata_backend(dataset_dir) == "sqlite":
+        if dirty is None:
+            _save_metadata_sqlite(dataset_dir, data)
+        else:
+            _save_metadata_sqlite_rows(dataset_dir, records)
+        _record_history(dataset_dir, full, records if dirty is not None else None)
+        return
+    path = _get_metadata_path(dataset_dir)
+    if dirty is not None and path.exists():
+        size = _append_journal(dataset_dir, records)
+        if size < max(METADATA_JOURNAL_COMPACT_MIN_BYTES, METADATA_JOURNAL_COMPACT_RATIO * path.stat().st_size):
+            _record_history(dataset_dir, full, records)
+            return
+        # Compaction folds the journal into the main file from the stored state (which now includes records), never
+        # from data: the caller's dict only holds scanned files, and other writers may have appended lines too.
+        out = _load_rel_metadata_json(dataset_dir)
+    else:
+        out = to_rel_metadata(dataset_dir, data)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    try:
+        _get_journal_path(dataset_dir).unlink()
+    except FileNotFoundError:
+        pass
+    _record_history(dataset_dir, lambda: out, records if dirty is not None else None)
+
+
+# History: every save appends a gzip'd version to .data/history/. Most versions are deltas
+# ({"set": {rel: entry}, "del": [rel]}) against the previous version; every HISTORY_CHECKPOINT_EVERY deltas a full
+# checkpoint is written. Legacy plain copies (video_metadata_YYYYMMDD_HHMMSS.json) are read as checkpoints.
+HISTORY_CHECKPOINT_EVERY = 20
+_HISTORY_NAME_RE = re.compile(r"^video_metadata_(\d{8}_\d{6})(?:_(\d{6}))?\.(?:(full|delta)\.json\.gz|json)$")
+
+
+def list_history_versions(dataset_dir: Path) -> List[Tuple[str, str, Path]]:
+    # (version id "YYYYMMDD_HHMMSS_ffffff", "full" | "delta", path), oldest first.
+    history_dir = dataset_dir / DATA_DIR_NAME / HISTORY_DIR_NAME
+    if not history_dir.is_dir():
+        return []
+    out = []
+    for entry in os.scandir(history_dir):
+        m = _HISTORY_NAME_RE.match(entry.name)
+        if m:
+            out.append(("%s_%s" % (m.group(1), m.group(2) or "000000"), m.group(3) or "full", Path(entry.path)))
+    out.sort(key=lambda v: v[0])
+    return out
+
+
+def _read_history_file(path: Path) -> Dict[str, Any]:
+    if path.suffix == ".gz":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    return _read_metadata_json(path)
+
+
+def _write_history_file(history_dir: Path, version: str, kind: str, data: Dict[str, Any]) -> Path:
+    path = history_dir / ("video_metadata_%s.%s.json.gz" % (version, kind))
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path
+
+
+def _apply_delta(data: Dict[str, Dict[str, str]], delta: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    for k in delta.get("del", []):
+        data.pop(k, None)
+    data.update(delta.get("set", {}))
+    return data
+
+
+def _compose_deltas(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    second_set, second_del = second.get("set", {}), set(second.get("del", []))
+    merged_set = {k: v for k, v in first.get("set", {}).items() if k not in second_del}
+    merged_set.update(second_set)
+    merged_del = (set(first.get("del", [])) - set(second_set)) | second_del
+    return {"set": merged_set, "del": sorted(merged_del)}
+
+
+def _diff_metadata(old: Dict[str, Dict[str, str]], new: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+    return {"set": {k: v for k, v in new.items() if old.get(k) != v}, "del": sorted(k for k in old if k not in new)}
+
+
+def _rebuild_version(versions: List[Tuple[str, str, Path]], index: int) -> Dict[str, Dict[str, str]]:
+    start = index
+    while start >= 0 and versions[start][1] != "full":
+        start -= 1
+    data = _read_history_file(versions[start][2]) if start >= 0 else {}
+    for _, _, path in versions[start + 1:index + 1]:
+        _apply_delta(data, _read_history_file(path))
+    return data
+
+
+def load_history_version(dataset_dir: Path, version: str) -> Dict[str, Dict[str, str]]:
+    # Rebuilds one saved version (relative keys, same shape as video_metadata.json).
+    versions = list_history_versions(dataset_dir)
+    for i, v in enumerate(versions):
+        if v[0] == version:
+            return _rebuild_version(versions, i)
+    raise KeyError("No such history version: %s" % version)
+
+
+def restore_history_version(dataset_dir: Path, version: str) -> None:
+    rel = load_history_version(dataset_dir, version)
+    save_metadata(dataset_dir, _from_rel_metadata(dataset_dir, ((k, v.get("tags"), v.get("notes")) for k, v in rel.items())))
+
+
+def _record_history(
+    dataset_dir: Path,
+    full: Callable[[], Dict[str, Dict[str, str]]],
+    changes: Optional[Dict[str, Optional[Dict[str, str]]]] = None,
+) -> None:
+    # full() builds the complete relative-keyed metadata (only called when needed); changes is the dirty set of
+    # an incremental save (None = full save, diffed against the latest version so identical saves are skipped).
+    history_dir = dataset_dir / DATA_DIR_NAME / HISTORY_DIR_NAME
+    history_dir.mkdir(parents=True, exist_ok=True)
+    versions = list_history_versions(dataset_dir)
+    since_full = 0
+    for _, kind, _ in reversed(versions):
+        if kind == "full":
+            break
+        since_full += 1
+    has_base = any(kind == "full" for _, kind, _ in versions)
+    if changes is None:
+        current = full()
+        delta = _diff_metadata(_rebuild_version(versions, len(versions) - 1), current) if versions else None
+    else:
+        current = None
+        delta = {"set": {k: v for k, v in changes.items() if v is not None}, "del": sorted(k for k, v in changes.items() if v is None)}
+    if delta is not None and not delta["set"] and not delta["del"]:
+        return
+    version = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    if not has_base or since_full >= HISTORY_CHECKPOINT_EVERY:
+        _write_history_file(history_dir, version, "full", current if current is not None else full())
+    else:
+        _write_history_file(history_dir, version, "delta", delta)
+    settings = load_settings(dataset_dir)
+    prune_history(dataset_dir, settings.get("history_keep_all_days"), settings.get("history_keep_daily_days"))
+
+
+def prune_history(
+    dataset_dir: Path,
+    keep_all_days: Optional[float] = None,
+    keep_daily_days: Optional[float] = None,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    # Retention: keep every version from the last keep_all_days, the last version per day up to keep_daily_days,
+    # and the last version per ISO week beyond that. A dropped version is folded into its successor so the
+    # chain still rebuilds. Returns the removed version ids.
+    keep_all_days = DEFAULT_SETTINGS["history_keep_all_days"] if keep_all_days is None else keep_all_days
+    keep_daily_days = DEFAULT_SETTINGS["history_keep_daily_days"] if keep_daily_days is None else keep_daily_days
+    now = now or datetime.now()
+    versions = list_history_versions(dataset_dir)
+    bucket_last: Dict[Tuple, int] = {}
+    buckets = []
+    for i, (version, _, _) in enumerate(versions):
+        ts = datetime.strptime(version, "%Y%m%d_%H%M%S_%f")
+        age_days = (now - ts).total_seconds() / 86400
+        if age_days <= keep_all_days:
+            bucket = ("all", i)
+        elif age_days <= keep_daily_days:
+            bucket = ("day", ts.date())
+        else:
+            bucket = ("week",) + tuple(ts.isocalendar()[:2])
+        buckets.append(bucket)
+        bucket_last[bucket] = i
+    removed = []
+    for i in range(len(versions) - 1):
+        if bucket_last[buckets[i]] == i:
+            continue
+        version, kind, path = versions[i]
+        next_version, next_kind, next_path = versions[i + 1]
+        if next_kind == "delta":
+            # Fold this version into its successor, which then carries the combined change (or becomes a checkpoint).
+            history_dir = next_path.parent
+            if kind == "full":
+                data = _apply_delta(_read_history_file(path), _read_history_file(next_path))
+                new_path = _write_history_file(history_dir, next_version, "full", data)
+                next_path.unlink()
+                versions[i + 1] = (next_version, "full", new_path)
+            else:
+                _write_history_file(history_dir, next_version, "delta", _compose_deltas(_read_history_file(path), _read_history_file(next_path)))
+        path.unlink()
+        removed.append(version)
+    return removed
+
+
+# SQLite backend: one row per file, WAL so readers (e.g. training jobs) never block a save.
+# Saves only write rows whose tags/notes changed.
+def _connect_metadata_db(dataset_dir: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(_get_metadata_db_path(dataset_dir)))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS metadata (path TEXT PRIMARY KEY, tags TEXT NOT NULL DEFAULT '', notes TEXT NOT NULL DEFAULT '') WITHOUT ROWID"
+    )
+    return conn
+
+
+def _load_metadata_sqlite(dataset_dir: Path) -> Dict[str, Dict[str, str]]:
+    try:
+        conn = _connect_metadata_db(dataset_dir)
+        try:
+            rows = conn.execute("SELECT path, tags, notes FROM metadata").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+    return _from_rel_metadata(dataset_dir, rows)
+
+
+def _write_metadata_rows(conn: sqlite3.Connection, upserts: List[Tuple[str, str, str]], deletes: List[str]) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT INTO metadata (path, tags, notes) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET tags = excluded.tags, notes = excluded.notes",
+            upserts,
+        )
+        conn.executemany("DELETE FROM metadata WHERE path = ?", ((k,) for k in deletes))
+
+
+def _save_metadata_sqlite(dataset_dir: Path, data: Dict[str, Dict[str, str]]) -> None:
+    out = to_rel_metadata(dataset_dir, data)
+    try:
+        conn = _connect_metadata_db(dataset_dir)
+        try:
+            existing = {k: (t, n) for k, t, n in conn.execute("SELECT path, tags, notes FROM metadata")}
+            upserts = []
+            for k, v in out.items():
+                row = (v.get("tags", "") or "", v.get("notes", "") or "")
+                if existing.get(k) != row:
+                    upserts.append((k,) + row)
+            deletes = [k for k in existing if k not in out]
+            if upserts or deletes:
+                _write_metadata_rows(conn, upserts, deletes)
+        finally:
+            conn.close()
+    except sqlite3.Error as ex:
+        raise OSError("SQLite error: %s" % ex) from ex
+
+
+def _save_metadata_sqlite_rows(dataset_dir: Path, records: Dict[str, Optional[Dict[str, str]]]) -> None:
+    upserts = [(k, v.get("tags", "") or "", v.get("notes", "") or "") for k, v in records.items() if v is not None]
+    deletes = [k for k, v in records.items() if v is None]
+    try:
+        conn = _connect_metadata_db(dataset_dir)
+        try:
+            _write_metadata_rows(conn, upserts, deletes)
+        finally:
+            conn.close()
+    except sqlite3.Error as ex:
+        raise OSError("SQLite error: %s" % ex) from ex
+
+
+def import_metadata_to_sqlite(dataset_dir: Path, json_path: Optional[Path] = None) -> int:
+    # One-shot JSON -> SQLite import; the table is replaced with the JSON contents. Returns the row count.
+    data = _read_metadata_json(json_path) if json_path else _load_rel_metadata_json(dataset_dir)
+    (dataset_dir / DATA_DIR_NAME).mkdir(parents=True, exist_ok=True)
+    conn = _connect_metadata_db(dataset_dir)
+    try:
+        with conn:
+            conn.execute("DELETE FROM metadata")
+        rows = [(k, v.get("tags", "") or "", v.get("notes", "") or "") for k, v in data.items()]
+        _write_metadata_rows(conn, rows, [])
+    finally:
+        conn.close()
+    return len(data)
+
+
+def export_metadata_from_sqlite(dataset_dir: Path, json_path: Optional[Path] = None) -> Path:
+    # Writes the SQLite contents in the video_metadata.json format (to .data/video_metadata.json by default).
+    conn = _connect_metadata_db(dataset_dir)
+    try:
+        rows = conn.execute("SELECT path, tags, notes FROM metadata ORDER BY path").fetchall()
+    finally:
+        conn.close()
+    path = json_path or _get_metadata_path(dataset_dir)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({k: {"tags": t, "notes": n} for k, t, n in rows}, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+# --- settings (.data/settings.json, optional) ---
+SETTINGS_FILENAME = "settings.json"
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    # Glob patterns (matched against the relative path and the name) of files/folders to skip when scanning.
+    "scan_exclude": [],
+    "scan_workers": 8,
+    "watch_poll_seconds": 5.0,
+    # "auto" (inotify on local Linux file systems, polling on NFS/SMB and elsewhere) | "poll"
+    "watch_mode": "auto",
+    # "auto" | "json" | "sqlite" (see get_metadata_backend)
+    "metadata_backend": "auto",
+    "history_keep_all_days": 7,
+    "history_keep_daily_days": 90,
+    # "auto" (virtual list above VIRTUAL_LIST_AUTO_ROWS files) | true | false
+    "virtual_list": "auto",
+    # "files" (one JPEG per preview) | "pack" (PackPreviewStore)
+    "preview_store": "files",
+    # Video frame used for previews: "keyframe" (first keyframe, no seeking) | "<seconds>s" | "<percent>%"
+    "preview_video_frame": "keyframe",
+    # Memory for decoded previews kept for quick browsing (PreviewImageCache).
+    "preview_cache_mb": 64,
+    # Preview worker processes: "auto" (see default_preview_workers) or a number.
+    "preview_workers": "auto",
+}
+
+
+def load_settings(dataset_dir: Path) -> Dict[str, Any]:
+    out = dict(DEFAULT_SETTINGS)
+    path = dataset_dir / DATA_DIR_NAME / SETTINGS_FILENAME
+    if not path.exists():
+        return out
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return out
+    if isinstance(data, dict):
+        out.update(data)
+    return out
+
+
+def merge_with_video_list(
+    video_paths: List[Path], metadata: Dict[str, Dict[str, str]], keys: Optional[Dict[Path, str]] = None
+) -> Dict[str, Dict[str, str]]:
+    # keys: optional precomputed path -> str(path.resolve()) map.
+    result = {}
+    for p in video_paths:
+        key = keys[p] if keys is not None else str(p.resolve())
+        result[key] = metadata.get(key, {"tags": "", "notes": ""}).copy()
+        result[key].setdefault("tags", "")
+        result[key].setdefault("notes", "")
+    return result
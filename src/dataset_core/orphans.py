@@ -0,0 +1,93 @@
+# dataset_core/orphans.py - garbage collection of orphaned previews and metadata entries
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .metadata import (
+    DATA_DIR_NAME,
+    METADATA_FILENAME,
+    load_metadata,
+    save_metadata,
+    to_rel_metadata,
+    write_json_atomic,
+)
+from .previews import PREVIEWS_DIR, PREVIEW_PACK_COMPACT_RATIO, PreviewManifest, open_preview_store, preview_name_for
+from .scan import scan_media
+
+
+# --- garbage collection: previews and metadata entries whose media file is gone ---
+GC_ARCHIVE_DIR_NAME = "gc_archive"
+
+
+def find_orphans(dataset_dir: Path, video_paths: Optional[List[Path]] = None, store=None) -> Dict[str, Any]:
+    # Compares the scan result (video_paths, default: a fresh scan) with the preview store / manifest and the stored
+    # metadata. Returns {"previews": [preview names], "preview_bytes": int, "manifest": [names without a preview],
+    # "metadata": [absolute keys]}. Entries whose source still exists on disk (e.g. excluded from the scan) are kept.
+    if video_paths is None:
+        video_paths = scan_media(dataset_dir)
+    root = dataset_dir.resolve()
+    live_keys = {str(p.resolve()) for p in video_paths}
+    live_names = set()
+    for key in live_keys:
+        try:
+            live_names.add(preview_name_for(str(Path(key).relative_to(root))))
+        except ValueError:
+            live_names.add(preview_name_for(Path(key).name))
+    manifest = PreviewManifest(dataset_dir).entries()
+    own = store is None
+    store = store or open_preview_store(dataset_dir)
+    try:
+        stored = set(store.names())
+        previews, preview_bytes = [], 0
+        for name in stored:
+            if name in live_names:
+                continue
+            src = manifest.get(name, {}).get("src")
+            if src is not None and (dataset_dir / src).exists():
+                continue
+            previews.append(name)
+            preview_bytes += store.size(name)
+    finally:
+        if own:
+            store.close()
+    metadata = load_metadata(dataset_dir)
+    return {
+        "previews": sorted(previews),
+        "preview_bytes": preview_bytes,
+        "manifest": sorted(n for n in manifest if n not in stored),
+        "metadata": sorted(k for k in metadata if k not in live_keys and not os.path.exists(k)),
+    }
+
+
+def collect_orphans(dataset_dir: Path, report: Dict[str, Any], archive: bool = False, store=None) -> Optional[Path]:
+    # Deletes what find_orphans reported, or with archive=True moves the previews (as JPEG files) and writes the
+    # dropped metadata entries (relative keys) to .data/gc_archive/<timestamp>/. A pack store is compacted afterwards
+    # if enough of it is dead. Returns the archive folder, if any.
+    dest = None
+    if archive:
+        dest = dataset_dir / DATA_DIR_NAME / GC_ARCHIVE_DIR_NAME / datetime.now().strftime("%Y%m%d_%H%M%S")
+        (dest / PREVIEWS_DIR).mkdir(parents=True, exist_ok=True)
+    own = store is None
+    store = store or open_preview_store(dataset_dir)
+    try:
+        if dest is not None:
+            for name in report["previews"]:
+                store.archive(name, dest / PREVIEWS_DIR / name)
+        store.delete(report["previews"])
+        store.compact(PREVIEW_PACK_COMPACT_RATIO)
+    finally:
+        if own:
+            store.close()
+    if report["previews"] or report["manifest"]:
+        manifest = PreviewManifest(dataset_dir)
+        manifest.forget(report["previews"] + report["manifest"])
+        manifest.close()
+    if report["metadata"]:
+        data = load_metadata(dataset_dir)
+        dead = {k: data.pop(k) for k in report["metadata"] if k in data}
+        if dest is not None:
+            write_json_atomic(dest / METADATA_FILENAME, to_rel_metadata(dataset_dir, dead))
+        save_metadata(dataset_dir, data, dirty=set(dead))
+    return dest
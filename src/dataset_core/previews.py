@@ -0,0 +1,959 @@
+# dataset_core/previews.py - preview stores, manifest, rendering and the preview scheduler
+
+import hashlib
+import heapq
+import importlib.util
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import BrokenExecutor, CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .metadata import DATA_DIR_NAME, load_settings
+from .scan import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+PREVIEWS_DIR = "previews"
+PREVIEW_EXT = ".jpg"
+PREVIEW_MAX_SIZE = (320, 240)
+PREVIEW_MANIFEST_FILENAME = "manifest.jsonl"
+# Above this many pixels (after any reduced-scale decode) an image is shrunk before any mode conversion.
+PREVIEW_MAX_DECODE_PIXELS = 64 * 1024 * 1024
+PREVIEW_PACK_FILENAME = "previews.pack"
+PREVIEW_PACK_INDEX_FILENAME = "previews.idx"
+PREVIEW_PACK_LOCK_FILENAME = "previews.lock"
+PREVIEW_PACK_COMPACT_RATIO = 0.5
+PREVIEW_PRIORITY_SELECTED = 0
+PREVIEW_PRIORITY_VISIBLE = 1
+PREVIEW_PRIORITY_NEIGHBOR = 2
+PREVIEW_PRIORITY_REST = 3
+
+_optional_modules: Dict[str, Any] = {}
+
+
+def optional_import(name: str):
+    # cv2 / PIL are imported on first use so that importing the core stays cheap; None if not installed.
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+
+def has_preview_backend() -> bool:
+    # True if cv2 or PIL is installed, without importing either.
+    return any(importlib.util.find_spec(name) is not None for name in ("cv2", "PIL"))
+
+
+def preview_rel_path(dataset_dir: Path, file_path: Path) -> str:
+    try:
+        return str(file_path.resolve().relative_to(dataset_dir.resolve()))
+    except ValueError:
+        return file_path.name
+
+
+def preview_name_for(rel: str) -> str:
+    return hashlib.md5(rel.encode("utf-8")).hexdigest() + PREVIEW_EXT
+
+
+def get_preview_path(dataset_dir: Path, file_path: Path) -> Path:
+    return dataset_dir / DATA_DIR_NAME / PREVIEWS_DIR / preview_name_for(preview_rel_path(dataset_dir, file_path))
+
+
+def _lock_file(f) -> None:
+    # Exclusive lock on an open file, blocking; released by _unlock_file (or closing it).
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # retries for ~10 s before raising
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class DirPreviewStore:
+    # Previews as one JPEG file each in .data/previews/ (the default). The set of names comes from one directory
+    # listing, so has() does not stat every preview.
+    def __init__(self, dataset_dir: Path):
+        self._dir = dataset_dir / DATA_DIR_NAME / PREVIEWS_DIR
+        self._lock = threading.Lock()
+        self._names: Optional[set] = None
+
+    def _load(self) -> set:
+        if self._names is None:
+            try:
+                self._names = {e.name for e in os.scandir(self._dir) if e.name.endswith(PREVIEW_EXT)}
+            except OSError:
+                self._names = set()
+        return self._names
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._load())
+
+    def has(self, name: str) -> bool:
+        with self._lock:
+            return name in self._load()
+
+    def size(self, name: str) -> int:
+        try:
+            return (self._dir / name).stat().st_size
+        except OSError:
+            return 0
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            return (self._dir / name).read_bytes()
+        except OSError:
+            return None
+
+    def put(self, name: str, data: bytes):
+        self._dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._dir / (name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, self._dir / name)
+        with self._lock:
+            self._load().add(name)
+
+    def delete(self, names: Iterable[str]):
+        with self._lock:
+            loaded = self._load()
+            for name in names:
+                loaded.discard(name)
+                try:
+                    (self._dir / name).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def archive(self, name: str, dest: Path):
+        try:
+            os.replace(self._dir / name, dest)
+        except FileNotFoundError:
+            pass
+
+    def loose_mtime_ns(self, name: str) -> Optional[int]:
+        # mtime of the preview file, for adopting previews written before the manifest existed.
+        try:
+            return (self._dir / name).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def compact(self, min_dead_ratio: float = 0.0) -> int:
+        return 0
+
+    def close(self):
+        pass
+
+
+class PackPreviewStore:
+    # All previews in one append-only blob file (previews.pack) read through mmap, plus an append-only index
+    # (previews.idx) of fixed-size (md5 digest, offset, length) records; later records win and length 0 deletes.
+    # Both files start with the same 16-byte header (magic + random token) so an index never gets paired with a
+    # pack it does not describe (e.g. after a crash during compaction). Replaced/deleted blobs are dead bytes until
+    # compact() rewrites the pack. Thread-safe, and safe across processes (the GUI and dataset_cli may share a pack):
+    # every operation holds an exclusive lock on previews.lock, picks up index records other processes appended, and
+    # reloads (reopening its handles) when another process compacted or reset the files. Files open lazily.
+    _MAGIC = b"MTPREV01"
+    _REC = struct.Struct("<16sQI")
+
+    def __init__(self, dataset_dir: Path):
+        self._dir = dataset_dir / DATA_DIR_NAME / PREVIEWS_DIR
+        self._pack_path = self._dir / PREVIEW_PACK_FILENAME
+        self._index_path = self._dir / PREVIEW_PACK_INDEX_FILENAME
+        self._lock_path = self._dir / PREVIEW_PACK_LOCK_FILENAME
+        self._lock = threading.RLock()
+        self._index: Optional[Dict[bytes, Tuple[int, int]]] = None
+        self._dead = 0
+        self._idx_ino: Optional[int] = None
+        self._idx_pos = 0  # bytes of previews.idx applied to _index (whole records only)
+        self._pack = None
+        self._idx = None
+        self._mm = None
+
+    @staticmethod
+    def _digest(name: str) -> bytes:
+        return bytes.fromhex(name[:32])
+
+    @contextmanager
+    def _locked(self):
+        # self._lock plus the cross-process file lock. Without a previews directory (nothing stored yet) or on a
+        # read-only mount there is no lock file, and no writer to coordinate with.
+        with self._lock:
+            try:
+                f = open(self._lock_path, "a+b")
+            except OSError:
+                f = None
+            try:
+                if f is not None:
+                    _lock_file(f)
+                yield
+            finally:
+                if f is not None:
+                    _unlock_file(f)
+                    f.close()
+
+    def _apply_records(self, body: bytes):
+        body = body[:len(body) - len(body) % self._REC.size]  # a torn last record is read again next time
+        for digest, offset, length in self._REC.iter_unpack(body):
+            old = self._index.pop(digest, None)
+            if old is not None:
+                self._dead += old[1]
+            if length:
+                self._index[digest] = (offset, length)
+        self._idx_pos += len(body)
+
+    def _load(self) -> Dict[bytes, Tuple[int, int]]:
+        # Called with _locked() held. Brings _index up to date with previews.idx.
+        try:
+            st = os.stat(self._index_path)
+        except OSError:
+            st = None
+        if self._index is not None and st is not None and st.st_ino == self._idx_ino:
+            if st.st_size > self._idx_pos:
+                with open(self._index_path, "rb") as f:
+                    f.seek(self._idx_pos)
+                    self._apply_records(f.read())
+            return self._index
+        # First load, or the files were replaced / removed by another process: start from scratch.
+        self._close_handles()
+        self._index, self._dead, self._idx_ino, self._idx_pos = {}, 0, None, 0
+        hl = len(self._MAGIC) + 8
+        try:
+            with open(self._pack_path, "rb") as f:
+                header = f.read(hl)
+            with open(self._index_path, "rb") as f:
+                raw = f.read()
+                ino = os.fstat(f.fileno()).st_ino
+        except OSError:
+            header, raw, ino = b"", b"", None
+        if header[:len(self._MAGIC)] == self._MAGIC and raw[:hl] == header:
+            self._idx_ino, self._idx_pos = ino, hl
+            self._apply_records(raw[hl:])
+        elif self._pack_path.exists() or self._index_path.exists():
+            # Unpaired or foreign files: start over (previews are regenerated).
+            for path in (self._pack_path, self._index_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        return self._index
+
+    def _open_for_write(self):
+        # Called with _locked() held, after _load().
+        if self._pack is not None:
+            return
+        if self._idx_ino is None:
+            header = self._MAGIC + os.urandom(8)
+            for path in (self._pack_path, self._index_path):
+                with open(path, "wb") as f:
+                    f.write(header)
+            self._load()
+        self._pack = open(self._pack_path, "ab")
+        self._idx = open(self._index_path, "ab")
+
+    def names(self) -> List[str]:
+        with self._locked():
+            return [d.hex() + PREVIEW_EXT for d in self._load()]
+
+    def has(self, name: str) -> bool:
+        with self._locked():
+            return self._digest(name) in self._load()
+
+    def size(self, name: str) -> int:
+        with self._locked():
+            return self._load().get(self._digest(name), (0, 0))[1]
+
+    def dead_bytes(self) -> int:
+        with self._locked():
+            self._load()
+            return self._dead
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._locked():
+            loc = self._load().get(self._digest(name))
+            if loc is None:
+                return None
+            offset, length = loc
+            if self._mm is None or offset + length > len(self._mm):
+                # The pack grew since it was mapped (or was never mapped).
+                if self._mm is not None:
+                    self._mm.close()
+                if self._pack is not None:
+                    self._pack.flush()
+                with open(self._pack_path, "rb") as f:
+                    self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mm[offset:offset + length]
+
+    def put(self, name: str, data: bytes):
+        digest = self._digest(name)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            self._load()
+            self._open_for_write()
+            offset = self._pack.seek(0, os.SEEK_END)
+            self._pack.write(data)
+            self._pack.flush()
+            self._append_index(self._REC.pack(digest, offset, len(data)))
+
+    def delete(self, names: Iterable[str]):
+        with self._locked():
+            index = self._load()
+            records = b"".join(self._REC.pack(self._digest(n), 0, 0) for n in names if self._digest(n) in index)
+            if records:
+                self._open_for_write()
+                self._append_index(records)
+
+    def _append_index(self, records: bytes):
+        if self._idx.seek(0, os.SEEK_END) != self._idx_pos:
+            self._idx.truncate(self._idx_pos)  # torn record left by a writer that crashed
+        self._idx.write(records)
+        self._idx.flush()
+        self._apply_records(records)
+
+    def archive(self, name: str, dest: Path):
+        data = self.get(name)
+        if data is not None:
+            dest.write_bytes(data)
+
+    def loose_mtime_ns(self, name: str) -> Optional[int]:
+        # A loose JPEG left from the "files" layout is moved into the pack; its mtime decides whether it is adopted.
+        path = self._dir / name
+        try:
+            mtime = path.stat().st_mtime_ns
+            self.put(name, path.read_bytes())
+            path.unlink()
+        except OSError:
+            return None
+        return mtime
+
+    def compact(self, min_dead_ratio: float = 0.0) -> int:
+        # Rewrites the pack with only live blobs (in offset order) when dead bytes exceed min_dead_ratio of the pack;
+        # returns the number of bytes reclaimed.
+        with self._locked():
+            index = self._load()
+            live = sum(length for _, length in index.values())
+            if not self._dead or self._dead < min_dead_ratio * (live + self._dead):
+                return 0
+            old_size = self._pack_path.stat().st_size
+            header = self._MAGIC + os.urandom(8)
+            tmp_pack = self._pack_path.with_suffix(".pack.tmp")
+            tmp_index = self._index_path.with_suffix(".idx.tmp")
+            with open(self._pack_path, "rb") as src, open(tmp_pack, "wb") as pf, open(tmp_index, "wb") as xf:
+                pf.write(header)
+                xf.write(header)
+                for digest, (offset, length) in sorted(index.items(), key=lambda kv: kv[1][0]):
+                    src.seek(offset)
+                    xf.write(self._REC.pack(digest, pf.tell(), length))
+                    pf.write(src.read(length))
+            self._close_handles()
+            # Index first: if we stop between the two replaces, the headers no longer match and the store resets.
+            os.replace(tmp_index, self._index_path)
+            os.replace(tmp_pack, self._pack_path)
+            self._index = None
+            self._load()
+            return old_size - self._pack_path.stat().st_size
+
+    def _close_handles(self):
+        for h in (self._mm, self._pack, self._idx):
+            if h is not None:
+                h.close()
+        self._mm = self._pack = self._idx = None
+
+    def close(self):
+        with self._lock:
+            self._close_handles()
+
+
+def open_preview_store(dataset_dir: Path, kind: Optional[str] = None):
+    # kind: "files" | "pack"; default from the preview_store setting.
+    if kind is None:
+        kind = load_settings(dataset_dir).get("preview_store", "files")
+    return PackPreviewStore(dataset_dir) if kind == "pack" else DirPreviewStore(dataset_dir)
+
+
+class PreviewManifest:
+    # .data/previews/manifest.jsonl: one {"name", "src", "size", "mtime_ns"} line per generated preview (later lines
+    # win, {"name", "deleted": true} forgets one). A preview is fresh when its recorded size/mtime match the source,
+    # so neither stale previews survive a re-encode nor is every preview file stat'ed. Thread-safe.
+    def __init__(self, dataset_dir: Path):
+        self._path = dataset_dir / DATA_DIR_NAME / PREVIEWS_DIR / PREVIEW_MANIFEST_FILENAME
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._file = None
+        self._ino = None
+
+    def _read(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        entries, lines = {}, 0
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line
+                    lines += 1
+                    if rec.get("deleted"):
+                        entries.pop(rec.get("name"), None)
+                    elif rec.get("name"):
+                        entries[rec["name"]] = rec
+        except OSError:
+            pass
+        return entries, lines
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = self._read()[0]
+        return self._entries
+
+    def _rewrite(self, entries: Dict[str, Dict[str, Any]]):
+        tmp = self._path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in entries.values():
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._path)
+
+    def _append(self, rec: Dict[str, Any]):
+        # Only writers compact, right before opening the file, from a fresh read so that lines other writers appended
+        # since _load are kept. A writer whose file was replaced meanwhile (another instance compacted it) reopens
+        # it instead of appending to the unlinked old one.
+        if self._file is not None:
+            try:
+                replaced = os.stat(self._path).st_ino != self._ino
+            except OSError:
+                replaced = True
+            if replaced:
+                self._file.close()
+                self._file = None
+        if self._file is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            entries, lines = self._read()
+            if lines > 2 * len(entries) + 100:
+                self._rewrite(entries)
+            self._file = open(self._path, "a", encoding="utf-8")
+            self._ino = os.fstat(self._file.fileno()).st_ino
+        self._file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load().get(name)
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._load())
+
+    def is_fresh(self, name: str, size: int, mtime_ns: int) -> bool:
+        rec = self.get(name)
+        return rec is not None and rec.get("size") == size and rec.get("mtime_ns") == mtime_ns
+
+    def record(self, name: str, src: str, size: int, mtime_ns: int, **extra):
+        # extra: optional details such as decode_ms / codec / frame.
+        rec = {"name": name, "src": src, "size": size, "mtime_ns": mtime_ns, **extra}
+        with self._lock:
+            self._load()[name] = rec
+            self._append(rec)
+
+    def forget(self, names: Iterable[str]):
+        with self._lock:
+            entries = self._load()
+            for name in names:
+                if entries.pop(name, None) is not None:
+                    self._append({"name": name, "deleted": True})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def parse_frame_strategy(spec: Any) -> Tuple[str, float]:
+    # "keyframe" -> ("keyframe", 0); "2.5s" -> ("timestamp", 2.5); "10%" -> ("percent", 10). Unknown -> keyframe.
+    text = str(spec or "").strip().lower()
+    try:
+        if text.endswith("%"):
+            return "percent", min(100.0, max(0.0, float(text[:-1])))
+        if text.endswith("s"):
+            return "timestamp", max(0.0, float(text[:-1]))
+    except ValueError:
+        pass
+    return "keyframe", 0.0
+
+
+def _fourcc_name(value: float) -> str:
+    code = int(value)
+    return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\0 ") if code > 0 else ""
+
+
+def _read_video_frame(file_path: Path, frame: Any, info: Optional[Dict[str, Any]] = None):
+    # OpenCV cannot seek to "the nearest keyframe" without decoding forward to the exact target, so "keyframe"
+    # reads the first frame (always a keyframe) and never seeks. Timestamp / percent seeks fall back to that frame.
+    cv2 = optional_import("cv2")
+    mode, value = parse_frame_strategy(frame)
+    cap = cv2.VideoCapture(str(file_path))
+    try:
+        if not cap.isOpened():
+            return None
+        if info is not None:
+            info["codec"] = _fourcc_name(cap.get(cv2.CAP_PROP_FOURCC))
+        ret, img = False, None
+        if mode == "timestamp" and value > 0:
+            cap.set(cv2.CAP_PROP_POS_MSEC, value * 1000)
+            ret, img = cap.read()
+        elif mode == "percent" and value > 0:
+            count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            if count > 1:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, min(int(count * value / 100), int(count) - 1))
+                ret, img = cap.read()
+        else:
+            return cap.read()[1]
+        if not ret:
+            cap.release()
+            cap = cv2.VideoCapture(str(file_path))
+            ret, img = cap.read()
+        return img if ret else None
+    finally:
+        cap.release()
+
+
+def render_preview(file_path: Path, frame: Any = "keyframe", info: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+    # JPEG bytes of the preview for file_path, or None. frame: video frame strategy (see parse_frame_strategy);
+    # info, if given, receives details such as the video codec.
+    suffix = file_path.suffix.lower()
+    Image = optional_import("PIL.Image") if suffix in IMAGE_EXTENSIONS else None
+    cv2 = optional_import("cv2") if suffix in VIDEO_EXTENSIONS else None
+    if Image is not None:
+        try:
+            with Image.open(file_path) as img:
+                # JPEG (and other drafting decoders) decode straight at 1/2..1/8 scale, still >= the preview size.
+                img.draft("RGB", PREVIEW_MAX_SIZE)
+                if img.width * img.height > PREVIEW_MAX_DECODE_PIXELS:
+                    # Huge image without reduced-scale decoding (PNG, TIFF, ...): shrink it in its own mode first, so
+                    # that the full-size decode is the only full-size buffer (no converted copy next to it).
+                    img.thumbnail(PREVIEW_MAX_SIZE, getattr(Image, "LANCZOS", Image.BICUBIC), reducing_gap=2.0)
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                # reducing_gap: cheap integer-factor reduce first, then a filtered resize of the small image.
+                img.thumbnail(PREVIEW_MAX_SIZE, getattr(Image, "LANCZOS", Image.BICUBIC), reducing_gap=2.0)
+                img = img.convert("RGB")
+                buf = io.BytesIO()
+                img.save(buf, "JPEG")
+                return buf.getvalue()
+        except Exception:
+            return None
+    if cv2 is not None:
+        img = _read_video_frame(file_path, frame, info)
+        if img is None:
+            return None
+        ok, buf = cv2.imencode(PREVIEW_EXT, img)
+        return buf.tobytes() if ok else None
+    return None
+
+
+def decode_preview(data: Optional[bytes]):
+    # Preview JPEG bytes -> fully loaded PIL image at most PREVIEW_MAX_SIZE, or None.
+    Image = optional_import("PIL.Image")
+    if data is None or Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.thumbnail(PREVIEW_MAX_SIZE, getattr(Image, "LANCZOS", Image.BICUBIC))
+        img.load()
+        return img
+    except Exception:
+        return None
+
+
+class PreviewImageCache:
+    # Decoded preview images by preview name, least recently used evicted beyond max_bytes (width * height * bands).
+    # prefetch() decodes names on a background thread; a newer request replaces the pending one.
+    # loader(name) -> image or None; misses are not cached (the preview may still be generated).
+    def __init__(self, loader: Callable[[str], Any], max_bytes: int):
+        self._loader = loader
+        self._max_bytes = max_bytes
+        self._items: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._thread = None
+        self._closed = False
+
+    def _put(self, name: str, img):
+        size = img.width * img.height * len(img.getbands())
+        old = self._items.pop(name, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._items[name] = (img, size)
+        self._bytes += size
+        while self._bytes > self._max_bytes and len(self._items) > 1:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self._bytes -= evicted
+
+    def get(self, name: str):
+        with self._cond:
+            item = self._items.get(name)
+            if item is not None:
+                self._items.move_to_end(name)
+                return item[0]
+        img = self._loader(name)
+        if img is not None:
+            with self._cond:
+                if not self._closed:
+                    self._put(name, img)
+        return img
+
+    def discard(self, name: str):
+        with self._cond:
+            old = self._items.pop(name, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def prefetch(self, names: List[str]):
+        with self._cond:
+            if self._closed:
+                return
+            self._pending = [n for n in names if n not in self._items]
+            self._cond.notify()
+            if self._thread is None and self._pending:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                name = self._pending.pop(0)
+                if name in self._items:
+                    continue
+            img = self._loader(name)
+            if img is not None:
+                with self._cond:
+                    if not self._closed:
+                        self._put(name, img)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._bytes = 0
+            self._pending = []
+            self._cond.notify()
+
+
+def generate_one_preview(file_path: Path, preview_path: Path, frame: Any = "keyframe") -> bool:
+    # Writes file_path's preview as a JPEG to preview_path, outside any preview store.
+    data = render_preview(file_path, frame)
+    if data is None:
+        return False
+    preview_path.parent.mkdir(parents=True, exist_ok=True)
+    preview_path.write_bytes(data)
+    return True
+
+
+def generate_stored_preview(dataset_dir: Path, file_path: Path, store=None, frame: Optional[str] = None) -> bool:
+    # Renders file_path's preview into store (default: open_preview_store(dataset_dir)); frame defaults to the
+    # preview_video_frame setting.
+    if frame is None:
+        frame = load_settings(dataset_dir).get("preview_video_frame", "keyframe")
+    data = render_preview(file_path, frame)
+    if data is None:
+        return False
+    own = store is None
+    store = store or open_preview_store(dataset_dir)
+    try:
+        store.put(preview_name_for(preview_rel_path(dataset_dir, file_path)), data)
+    finally:
+        if own:
+            store.close()
+    return True
+
+
+def _preview_worker_init():
+    # Loads the decoders (and Pillow's format plugins) when a worker starts, so that their import is not counted in
+    # the decode_ms of the worker's first job.
+    optional_import("cv2")
+    Image = optional_import("PIL.Image")
+    if Image is not None:
+        Image.init()
+
+
+def _preview_worker_id() -> Tuple[int, int]:
+    time.sleep(0.05)  # long enough that one ready worker cannot take every probe
+    return os.getpid(), threading.get_ident()
+
+
+def timed_render_preview(file_path: str, frame: str) -> Tuple[Optional[bytes], Dict[str, Any]]:
+    # (JPEG bytes or None, details incl. decode_ms). The preview pool's job: it runs in a worker process and the
+    # parent writes the bytes to the store and the details to the manifest.
+    info: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    data = render_preview(Path(file_path), frame, info)
+    info["decode_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return data, info
+
+
+def summarize_preview_timings(dataset_dir: Path) -> Dict[str, Dict[str, float]]:
+    # Per codec (file extension for images) from the manifest: {"count", "mean_ms", "max_ms"}, slowest first.
+    per: Dict[str, List[float]] = {}
+    for rec in PreviewManifest(dataset_dir).entries().values():
+        if "decode_ms" in rec:
+            codec = rec.get("codec") or Path(rec.get("src", "")).suffix.lower() or "?"
+            per.setdefault(codec, []).append(rec["decode_ms"])
+    out = {
+        codec: {"count": len(ms), "mean_ms": round(sum(ms) / len(ms), 1), "max_ms": max(ms)} for codec, ms in per.items()
+    }
+    return dict(sorted(out.items(), key=lambda kv: -kv[1]["mean_ms"]))
+
+
+def default_preview_workers() -> int:
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+class PreviewScheduler:
+    # Generates missing previews on a process pool. Pending keys wait in a heap ordered by (priority, submit order);
+    # reprioritize() re-pushes keys with their new priority and stale heap entries are skipped when popped.
+    # Workers return JPEG bytes which are written to store (default: open_preview_store) from this process.
+    # on_done(key, preview_name, ok) is called from a pool thread for every preview actually generated.
+    # frame: video frame strategy (default: the preview_video_frame setting).
+    def __init__(
+        self,
+        dataset_dir: Path,
+        on_done: Callable[[str, str, bool], None],
+        workers: Optional[int] = None,
+        store=None,
+        frame: Optional[str] = None,
+    ):
+        self._dataset_dir = dataset_dir
+        self._on_done = on_done
+        self._workers = max(1, workers or default_preview_workers())
+        self._manifest = PreviewManifest(dataset_dir)
+        self._frame = str(frame or load_settings(dataset_dir).get("preview_video_frame", "keyframe"))
+        self._own_store = store is None
+        self._store = store or open_preview_store(dataset_dir)
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[int, int, str]] = []
+        self._prio: Dict[str, int] = {}
+        self._order: Dict[str, int] = {}
+        self._boosted = set()
+        self._running = set()
+        self._retried = set()
+        self._seq = 0
+        self._stopped = False
+        self._executor = None
+        self._thread = None
+
+    def submit(self, keys: Iterable[str]):
+        with self._cond:
+            if self._stopped:
+                return
+            for key in keys:
+                if key in self._prio or key in self._running:
+                    continue
+                self._order[key] = self._seq
+                self._seq += 1
+                self._push(key, PREVIEW_PRIORITY_REST)
+            self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, daemon=True)
+                self._thread.start()
+
+    def reprioritize(self, priorities: Dict[str, int]):
+        # priorities: key -> PREVIEW_PRIORITY_*; keys boosted by the previous call fall back to PREVIEW_PRIORITY_REST.
+        with self._cond:
+            for key in self._boosted:
+                if key in self._prio and key not in priorities:
+                    self._push(key, PREVIEW_PRIORITY_REST)
+            self._boosted = set()
+            for key, prio in priorities.items():
+                if key in self._prio:
+                    self._boosted.add(key)
+                    if self._prio[key] != prio:
+                        self._push(key, prio)
+            if len(self._heap) > 2 * len(self._prio) + 1024:
+                self._heap = [(p, self._order[k], k) for k, p in self._prio.items()]
+                heapq.heapify(self._heap)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._prio) + len(self._running)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        # Blocks until every submitted key is done (on_done included) or stop(); False on timeout.
+        with self._cond:
+            return self._cond.wait_for(lambda: self._stopped or not (self._prio or self._running), timeout)
+
+    def start_workers(self, rounds: int = 20) -> int:
+        # Optional: starts the pool now and waits until every worker has loaded the decoders (otherwise that happens
+        # with the first jobs), so callers can time start-up apart from generation. Returns the workers seen.
+        with self._cond:
+            executor = self._get_executor()
+        seen = set()
+        if executor is None:
+            return 0
+        try:
+            for _ in range(rounds):
+                seen.update(f.result() for f in [executor.submit(_preview_worker_id) for _ in range(self._workers)])
+                if len(seen) >= self._workers:
+                    break
+        except (RuntimeError, BrokenExecutor, CancelledError):
+            pass  # stop() shut the pool down meanwhile
+        return len(seen)
+
+    def stop(self, wait: bool = False):
+        # wait: also wait for the worker processes to exit.
+        with self._cond:
+            self._stopped = True
+            self._heap, self._prio, self._order, self._boosted = [], {}, {}, set()
+            executor, self._executor = self._executor, None
+            self._cond.notify_all()
+            self._manifest.close()
+            if self._own_store:
+                self._store.close()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _push(self, key: str, prio: int):
+        self._prio[key] = prio
+        heapq.heappush(self._heap, (prio, self._order[key], key))
+
+    def _pop(self) -> Optional[str]:
+        while self._heap:
+            prio, _, key = heapq.heappop(self._heap)
+            if self._prio.get(key) == prio:
+                del self._prio[key], self._order[key]
+                self._boosted.discard(key)
+                return key
+        return None
+
+    def _get_executor(self):
+        # Call with self._cond held: stop() takes the executor under it, so one created after stop() would never be
+        # shut down. None once stopped.
+        if self._stopped:
+            return None
+        if self._executor is None:
+            try:
+                # spawn: forking a process that runs Tk (and other threads) is not safe.
+                self._executor = ProcessPoolExecutor(
+                    self._workers, mp_context=multiprocessing.get_context("spawn"), initializer=_preview_worker_init
+                )
+            except (OSError, NotImplementedError):
+                self._executor = ThreadPoolExecutor(self._workers, initializer=_preview_worker_init)
+        return self._executor
+
+    def _dispatch(self):
+        # Keeps at most 2 jobs per worker in flight, so a newly prioritized key waits for little else.
+        while True:
+            with self._cond:
+                while not self._stopped and (not self._prio or len(self._running) >= 2 * self._workers):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                key = self._pop()
+                if key is None:
+                    continue
+                executor = self._get_executor()
+                if executor is None:
+                    return
+                self._running.add(key)
+            rel = preview_rel_path(self._dataset_dir, Path(key))
+            name = preview_name_for(rel)
+            try:
+                st = os.stat(key)
+            except OSError:
+                self._finish(key)
+                continue
+            if self._is_fresh(rel, name, st):
+                self._finish(key)
+                continue
+            try:
+                fut = executor.submit(timed_render_preview, key, self._frame)
+            except (RuntimeError, BrokenExecutor) as ex:
+                self._retry(key, executor, ex)
+                continue
+            fut.add_done_callback(lambda f, k=key, r=rel, st=st, e=executor: self._job_done(k, r, st, e, f))
+
+    def _is_fresh(self, rel: str, name: str, st: os.stat_result) -> bool:
+        has = self._store.has(name)
+        if has and self._manifest.is_fresh(name, st.st_size, st.st_mtime_ns):
+            return True
+        if not has or self._manifest.get(name) is None:
+            # Preview written before the manifest (or the current store layout) existed: adopt it if it is newer
+            # than its source.
+            mtime = self._store.loose_mtime_ns(name)
+            if mtime is not None and mtime >= st.st_mtime_ns:
+                with self._cond:
+                    if not self._stopped:
+                        self._manifest.record(name, rel, st.st_size, st.st_mtime_ns)
+                return True
+        return False
+
+    def _job_done(self, key: str, rel: str, st: os.stat_result, executor, fut):
+        if fut.cancelled():
+            return self._finish(key)
+        try:
+            data, info = fut.result()
+        except BrokenExecutor as ex:
+            return self._retry(key, executor, ex)
+        except Exception:
+            data, info = None, {}
+        name = preview_name_for(rel)
+        if data is not None:
+            if Path(key).suffix.lower() in VIDEO_EXTENSIONS:
+                info["frame"] = self._frame
+            # Under the lock: stop() closes the store and manifest, and writing after that would reopen them.
+            with self._cond:
+                if not self._stopped:
+                    self._store.put(name, data)
+                    self._manifest.record(name, rel, st.st_size, st.st_mtime_ns, **info)
+        try:
+            if not self._stopped:
+                self._on_done(key, name, data is not None)
+        finally:
+            self._finish(key)
+
+    def _retry(self, key: str, executor, ex: Exception):
+        # A crashing decoder breaks the whole process pool: start a new one and retry each affected key once.
+        with self._cond:
+            self._running.discard(key)
+            if self._executor is executor and isinstance(ex, BrokenExecutor):
+                self._executor = None
+            if not self._stopped and key not in self._retried:
+                self._retried.add(key)
+                self._order[key] = self._seq
+                self._seq += 1
+                self._push(key, PREVIEW_PRIORITY_REST)
+            self._cond.notify_all()
+
+    def _finish(self, key: str):
+        with self._cond:
+            self._running.discard(key)
+            self._cond.notify_all()
@@ -0,0 +1,145 @@
+# dataset_core/scan.py - media file scanning with the directory scan cache
+
+import fnmatch
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .metadata import DATA_DIR_NAME, load_settings, write_json_atomic
+
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".webm"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif"}
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS | IMAGE_EXTENSIONS
+SCAN_CACHE_FILENAME = "scan_cache.json"
+SCAN_CACHE_VERSION = 1
+SCAN_CACHE_RACY_NS = 2 * 10**9
+
+
+def is_scan_excluded(rel: str, name: str, excludes: Tuple[str, ...]) -> bool:
+    return any(fnmatch.fnmatch(rel, pat) or fnmatch.fnmatch(name, pat) for pat in excludes)
+
+
+def _list_media_dir(
+    path: str, rel: str, excludes: Tuple[str, ...], cached: Optional[list] = None
+) -> Tuple[List[str], List[Tuple[str, str]], Optional[list]]:
+    # Returns (media files, subdirs, scan cache entry [mtime_ns, file names, subdir names]).
+    # A directory whose mtime matches the cache is not listed again; its subdirs are still visited,
+    # since changes deeper in the tree do not touch the parent's mtime.
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return [], [], None
+    if cached is not None and cached[0] == mtime:
+        return (
+            [os.path.join(path, n) for n in cached[1]],
+            [(os.path.join(path, n), rel + "/" + n if rel else n) for n in cached[2]],
+            cached,
+        )
+    # One scandir pass: d_type tells files from dirs without an extra stat; .data and excluded dirs are pruned here.
+    files, dirs, file_names, dir_names = [], [], [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                rel_entry = rel + "/" + name if rel else name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if name != DATA_DIR_NAME and not is_scan_excluded(rel_entry, name, excludes):
+                            dirs.append((entry.path, rel_entry))
+                            dir_names.append(name)
+                    elif os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS and entry.is_file():
+                        if not excludes or not is_scan_excluded(rel_entry, name, excludes):
+                            files.append(entry.path)
+                            file_names.append(name)
+                except OSError:
+                    continue
+    except OSError:
+        return [], [], None
+    # mtimes within the racy window may still change without a visible tick (coarse NAS timestamps): don't trust them.
+    if time.time_ns() - mtime < SCAN_CACHE_RACY_NS:
+        mtime = None
+    return files, dirs, [mtime, file_names, dir_names]
+
+
+def _get_scan_cache_path(dataset_dir: Path) -> Path:
+    return dataset_dir / DATA_DIR_NAME / SCAN_CACHE_FILENAME
+
+
+def _scan_cache_signature(excludes: Tuple[str, ...]) -> Dict[str, Any]:
+    return {"version": SCAN_CACHE_VERSION, "excludes": list(excludes), "extensions": sorted(MEDIA_EXTENSIONS)}
+
+
+def load_scan_cache(dataset_dir: Path, excludes: Tuple[str, ...]) -> Dict[str, list]:
+    path = _get_scan_cache_path(dataset_dir)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    if not isinstance(data, dict) or data.get("signature") != _scan_cache_signature(excludes):
+        return {}
+    dirs = data.get("dirs")
+    return dirs if isinstance(dirs, dict) else {}
+
+
+def save_scan_cache(dataset_dir: Path, excludes: Tuple[str, ...], dirs: Dict[str, list]) -> None:
+    try:
+        (dataset_dir / DATA_DIR_NAME).mkdir(parents=True, exist_ok=True)
+        write_json_atomic(_get_scan_cache_path(dataset_dir), {"signature": _scan_cache_signature(excludes), "dirs": dirs})
+    except OSError:
+        pass
+
+
+def scan_media(
+    dataset_dir: Path,
+    excludes: Optional[Iterable[str]] = None,
+    max_workers: Optional[int] = None,
+    use_cache: bool = False,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    write_cache: bool = True,
+) -> List[Path]:
+    # use_cache reads .data/scan_cache.json; write_cache=False leaves it untouched (read-only callers).
+    if not dataset_dir.is_dir():
+        return []
+    if excludes is None or max_workers is None:
+        settings = load_settings(dataset_dir)
+        if excludes is None:
+            excludes = settings.get("scan_exclude") or []
+        if max_workers is None:
+            max_workers = settings.get("scan_workers") or 1
+    excludes = tuple(excludes)
+    old_cache = load_scan_cache(dataset_dir, excludes) if use_cache else {}
+    new_cache: Dict[str, list] = {}
+    found: List[str] = []
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        pending = {pool.submit(_list_media_dir, str(dataset_dir), "", excludes, old_cache.get(""))}
+        rels = {next(iter(pending)): ""}
+        while pending:
+            if cancel is not None and cancel.is_set():
+                for fut in pending:
+                    fut.cancel()
+                return []
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                files, dirs, entry = fut.result()
+                rel = rels.pop(fut)
+                if entry is not None:
+                    new_cache[rel] = entry
+                found.extend(files)
+                for sub_path, sub_rel in dirs:
+                    sub = pool.submit(_list_media_dir, sub_path, sub_rel, excludes, old_cache.get(sub_rel))
+                    rels[sub] = sub_rel
+                    pending.add(sub)
+            if progress is not None:
+                progress(len(found))
+    if use_cache and write_cache:
+        save_scan_cache(dataset_dir, excludes, new_cache)
+    return sorted(Path(f) for f in found)
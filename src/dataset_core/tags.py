@@ -0,0 +1,265 @@
+# dataset_core/tags.py - tag normalization, counting, tag queries and the TagIndex
+
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_tags(raw: str) -> str:
+    if not raw or not raw.strip():
+        return ""
+    parts = re.split(r"[\s;,]+", raw.strip())
+    return "; ".join(p.strip() for p in parts if p.strip())
+
+
+def count_tags_in_metadata(metadata: Dict[str, Dict[str, str]]) -> Counter:
+    c = Counter()
+    for entry in metadata.values():
+        for tag in (t.strip() for t in (entry.get("tags") or "").split(";") if t.strip()):
+            c[tag] += 1
+    return c
+
+
+def get_all_tags(metadata: Dict[str, Dict[str, str]]) -> List[str]:
+    tags = set()
+    for entry in metadata.values():
+        for tag in (t.strip() for t in (entry.get("tags") or "").split(";") if t.strip()):
+            tags.add(tag)
+    return sorted(tags)
+
+
+def split_tags(tags: Optional[str]) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(t.strip() for t in (tags or "").split(";") if t.strip()))
+
+
+class TagQueryError(ValueError):
+    pass
+
+
+_TAG_QUERY_TOKEN_RE = re.compile(r"\s*(\(|\)|&&|\|\||[&|!]|-(?=\S)|[^\s()&|!]+)")
+_TAG_QUERY_OR = ("or", "|", "||")
+_TAG_QUERY_AND = ("and", "&", "&&")
+_TAG_QUERY_NOT = ("not", "!", "-")
+
+
+class TagQuery:
+    # Exact, case-insensitive tag queries: train AND (val OR test) NOT synth*, with & | ! - as operator aliases,
+    # implicit AND between terms and a trailing * for prefix matches ("*" alone = any tag, so "NOT *" = untagged).
+    def __init__(self, text: str):
+        self.text = text
+        self._tokens = []
+        pos = 0
+        stripped = text.rstrip()
+        while pos < len(stripped):
+            m = _TAG_QUERY_TOKEN_RE.match(stripped, pos)
+            if not m:
+                raise TagQueryError("Cannot parse query at: %s" % stripped[pos:])
+            self._tokens.append(m.group(1))
+            pos = m.end()
+        self._pos = 0
+        if not self._tokens:
+            raise TagQueryError("Empty query")
+        self._ast = self._parse_or()
+        if self._pos < len(self._tokens):
+            raise TagQueryError("Unexpected %r" % self._tokens[self._pos])
+
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _parse_or(self):
+        node = self._parse_and()
+        while (self._peek() or "").lower() in _TAG_QUERY_OR:
+            self._pos += 1
+            node = ("or", node, self._parse_and())
+        return node
+
+    def _parse_and(self):
+        node = self._parse_not()
+        while True:
+            tok = self._peek()
+            if tok is None or tok == ")" or tok.lower() in _TAG_QUERY_OR:
+                return node
+            if tok.lower() in _TAG_QUERY_AND:
+                self._pos += 1
+            node = ("and", node, self._parse_not())
+
+    def _parse_not(self):
+        tok = self._peek()
+        if tok is None:
+            raise TagQueryError("Unexpected end of query")
+        self._pos += 1
+        if tok.lower() in _TAG_QUERY_NOT:
+            return ("not", self._parse_not())
+        if tok == "(":
+            node = self._parse_or()
+            if self._peek() != ")":
+                raise TagQueryError("Missing )")
+            self._pos += 1
+            return node
+        if tok == ")" or tok.lower() in _TAG_QUERY_OR + _TAG_QUERY_AND:
+            raise TagQueryError("Unexpected %r" % tok)
+        term = tok.lower()
+        if term.endswith("*"):
+            return ("prefix", term[:-1])
+        return ("tag", term)
+
+    def matches(self, tags: Iterable[str]) -> bool:
+        return self._match(self._ast, set(t.lower() for t in tags))
+
+    def _match(self, node, tags: set) -> bool:
+        op = node[0]
+        if op == "tag":
+            return node[1] in tags
+        if op == "prefix":
+            return any(t.startswith(node[1]) for t in tags)
+        if op == "not":
+            return not self._match(node[1], tags)
+        if op == "and":
+            return self._match(node[1], tags) and self._match(node[2], tags)
+        return self._match(node[1], tags) or self._match(node[2], tags)
+
+
+def parse_tag_query(text: str) -> Optional[TagQuery]:
+    return TagQuery(text) if text and text.strip() else None
+
+
+def evaluate_tag_query(
+    query: Any,
+    lowered: Dict[str, List[str]],
+    rows_of: Callable[[str], Any],
+    all_rows: Callable[[], Any],
+    empty: Callable[[], Any],
+) -> Any:
+    # Runs a TagQuery (or query text) over row sets, e.g. sets of row ids or int bitsets (anything with & | ^).
+    # lowered maps a lowercased tag to the tags spelled that way; rows_of(tag) is that tag's row set and is never
+    # modified; empty() makes a new empty row set (set, int).
+    if not isinstance(query, TagQuery):
+        query = TagQuery(query)
+
+    def ev(node):
+        op = node[0]
+        if op in ("tag", "prefix"):
+            rows = empty()
+            if op == "tag":
+                names = lowered.get(node[1], ())
+            else:
+                names = [t for low, tags in lowered.items() if low.startswith(node[1]) for t in tags]
+            for t in names:
+                rows |= rows_of(t)
+            return rows
+        if op == "not":
+            everything = all_rows()
+            return everything ^ (everything & ev(node[1]))
+        if op == "and":
+            return ev(node[1]) & ev(node[2])
+        return ev(node[1]) | ev(node[2])
+
+    return ev(query._ast)
+
+
+class TagIndex:
+    # Inverted index tag -> set of metadata keys, kept up to date per entry so counts and the tag list
+    # cost O(#tags) instead of re-splitting every tags string. Queries run on per-tag bitsets over integer
+    # row ids (Python ints), built lazily from the key sets and cached until that tag changes.
+    def __init__(self, metadata: Optional[Dict[str, Dict[str, str]]] = None):
+        self._tag_keys: Dict[str, set] = {}
+        self._key_tags: Dict[str, Tuple[str, ...]] = {}
+        self._untagged = 0
+        self._key_ids: Dict[str, int] = {}
+        self._id_keys: List[Optional[str]] = []
+        self._bits: Dict[str, int] = {}
+        self._all_bits: Optional[int] = None
+        if metadata:
+            for key, entry in metadata.items():
+                self.set(key, entry.get("tags") or "")
+
+    def __len__(self) -> int:
+        return len(self._key_tags)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_tags
+
+    def set(self, key: str, tags: Optional[str]) -> None:
+        new = split_tags(tags)
+        old = self._key_tags.get(key)
+        if old == new:
+            return
+        if old is not None:
+            self._unlink(key, old)
+        else:
+            self._key_ids[key] = len(self._id_keys)
+            self._id_keys.append(key)
+            self._all_bits = None
+        self._key_tags[key] = new
+        for t in new:
+            self._tag_keys.setdefault(t, set()).add(key)
+            self._bits.pop(t, None)
+        if not new:
+            self._untagged += 1
+
+    def remove(self, key: str) -> None:
+        old = self._key_tags.pop(key, None)
+        if old is not None:
+            self._unlink(key, old)
+            self._id_keys[self._key_ids.pop(key)] = None
+            self._all_bits = None
+
+    def _unlink(self, key: str, tags: Tuple[str, ...]) -> None:
+        if not tags:
+            self._untagged -= 1
+        for t in tags:
+            self._bits.pop(t, None)
+            keys = self._tag_keys[t]
+            keys.discard(key)
+            if not keys:
+                del self._tag_keys[t]
+
+    def tags_of(self, key: str) -> Tuple[str, ...]:
+        return self._key_tags.get(key, ())
+
+    def keys_for(self, tag: str) -> set:
+        return self._tag_keys.get(tag, set())
+
+    def counts(self) -> Counter:
+        return Counter({t: len(keys) for t, keys in self._tag_keys.items()})
+
+    def tags(self) -> List[str]:
+        return sorted(self._tag_keys)
+
+    def untagged_count(self) -> int:
+        return self._untagged
+
+    def _keys_to_bits(self, keys: Iterable[str]) -> int:
+        buf = bytearray((len(self._id_keys) + 7) // 8)
+        ids = self._key_ids
+        for k in keys:
+            i = ids[k]
+            buf[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buf, "little")
+
+    def _bits_to_keys(self, bits: int) -> set:
+        digits = bin(bits)[:1:-1]  # bit i at position i
+        out = set()
+        i = digits.find("1")
+        while i >= 0:
+            out.add(self._id_keys[i])
+            i = digits.find("1", i + 1)
+        return out
+
+    def _tag_bits(self, tag: str) -> int:
+        bits = self._bits.get(tag)
+        if bits is None:
+            bits = self._bits[tag] = self._keys_to_bits(self._tag_keys[tag])
+        return bits
+
+    def _all(self) -> int:
+        if self._all_bits is None:
+            self._all_bits = self._keys_to_bits(self._key_tags)
+        return self._all_bits
+
+    def query(self, query: Any) -> set:
+        # query: TagQuery or query text; returns the matching keys.
+        lowered: Dict[str, List[str]] = {}
+        for t in self._tag_keys:
+            lowered.setdefault(t.lower(), []).append(t)
+        return self._bits_to_keys(evaluate_tag_query(query, lowered, self._tag_bits, self._all, int))
@@ -0,0 +1,363 @@
+# dataset_core/watch.py - file system watchers (inotify on Linux, polling elsewhere)
+
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .metadata import DATA_DIR_NAME, load_settings
+from .scan import MEDIA_EXTENSIONS, is_scan_excluded, scan_media
+
+
+# --- watcher (inotify on Linux, polling elsewhere) ---
+# Watchers report batches of (op, path, old_path) from their own thread:
+# ("add", p, None), ("remove", p, None), ("rename", new, old), ("remove_dir", d, None), ("resync", "", None).
+WATCH_POLL_SECONDS = 5.0
+# inotify only sees changes made through this kernel: files written by other hosts on these never show up.
+REMOTE_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "lustre", "davfs", "fuse.sshfs"}
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+WatchChange = Tuple[str, str, Optional[str]]
+
+_log = logging.getLogger(__name__)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class PollingWatcher:
+    def __init__(
+        self,
+        dataset_dir: Path,
+        on_changes: Callable[[List[WatchChange]], None],
+        initial: Optional[Iterable[Path]] = None,
+        interval: float = WATCH_POLL_SECONDS,
+    ):
+        self._dataset_dir = dataset_dir
+        self._on_changes = on_changes
+        self._known = set(str(p) for p in initial) if initial is not None else None
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self):
+        if self._known is None:
+            self._known = set(str(p) for p in scan_media(self._dataset_dir, use_cache=True))
+        # (size, mtime_ns) of every known file: a removed file can no longer be stat'ed, and a rename keeps both.
+        for p in self._known:
+            if self._stop.is_set():
+                return
+            sig = _file_signature(p)
+            if sig is not None:
+                self._signatures[p] = sig
+        while not self._stop.wait(self._interval):
+            # The scan cache keeps this cheap: only directories whose mtime changed are listed again.
+            current = set(str(p) for p in scan_media(self._dataset_dir, use_cache=True, cancel=self._stop))
+            if self._stop.is_set():
+                return
+            changes = self._diff(sorted(self._known - current), sorted(current - self._known))
+            self._known = current
+            if changes:
+                self._on_changes(changes)
+
+    def _diff(self, removed: List[str], added: List[str]) -> List[WatchChange]:
+        # Pairs removed and added files with the same (size, mtime_ns) into renames, so their tags move along;
+        # among several candidates the one with the same file name wins.
+        by_sig: Dict[Tuple[int, int], List[str]] = {}
+        for p in removed:
+            sig = self._signatures.pop(p, None)
+            if sig is not None:
+                by_sig.setdefault(sig, []).append(p)
+        changes: List[WatchChange] = []
+        renamed = set()
+        for p in added:
+            sig = _file_signature(p)
+            if sig is None:
+                continue
+            self._signatures[p] = sig
+            olds = by_sig.get(sig)
+            if olds:
+                name = os.path.basename(p)
+                old = next((o for o in olds if os.path.basename(o) == name), olds[0])
+                olds.remove(old)
+                renamed.add(old)
+                changes.append(("rename", p, old))
+            else:
+                changes.append(("add", p, None))
+        return [("remove", p, None) for p in removed if p not in renamed] + changes
+
+
+class InotifyWatcher:
+    # Falls back to a PollingWatcher (with a logged warning) when a watch cannot be added, e.g. ENOSPC once
+    # fs.inotify.max_user_watches is reached: part of the tree would otherwise silently stop updating.
+    def __init__(
+        self,
+        dataset_dir: Path,
+        on_changes: Callable[[List[WatchChange]], None],
+        excludes: Optional[Iterable[str]] = None,
+        initial: Optional[Iterable[Path]] = None,
+        interval: float = WATCH_POLL_SECONDS,
+    ):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._ctypes = ctypes
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dataset_dir = dataset_dir
+        self._root = str(dataset_dir)
+        self._on_changes = on_changes
+        if excludes is None:
+            excludes = load_settings(dataset_dir).get("scan_exclude") or []
+        self._excludes = tuple(excludes)
+        self._initial = list(initial) if initial is not None else None
+        self._interval = interval
+        self._wd_paths: Dict[int, str] = {}
+        self._moved_from: Dict[int, Tuple[str, bool]] = {}
+        self._add_error: Optional[OSError] = None
+        self._fallback: Optional[PollingWatcher] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        # The initial walk runs on the watcher thread: on large trees it takes as long as a scan.
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._fallback is not None:
+            self._fallback.stop()
+
+    def _poll_instead(self) -> None:
+        _log.warning("inotify watch failed (%s); polling %s every %s s instead", self._add_error, self._root, self._interval)
+        # Changes inotify already reported are reported again relative to initial; applying them twice is harmless.
+        self._fallback = PollingWatcher(self._dataset_dir, self._on_changes, self._initial, self._interval)
+        if not self._stop.is_set():
+            self._fallback.start()
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self._root).replace(os.sep, "/")
+
+    def _skip_dir(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return name == DATA_DIR_NAME or is_scan_excluded(self._rel(path), name, self._excludes)
+
+    def _is_media(self, path: str) -> bool:
+        name = os.path.basename(path)
+        if os.path.splitext(name)[1].lower() not in MEDIA_EXTENSIONS:
+            return False
+        rel = self._rel(path)
+        return not rel.startswith(DATA_DIR_NAME + "/") and not (self._excludes and is_scan_excluded(rel, name, self._excludes))
+
+    def _add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _INOTIFY_MASK)
+        if wd >= 0:
+            self._wd_paths[wd] = path
+            return
+        err = self._ctypes.get_errno()
+        # A directory removed before its watch was added is not a failure of the watcher.
+        if err not in (errno.ENOENT, errno.ENOTDIR) and self._add_error is None:
+            self._add_error = OSError(err, "%s: %s" % (os.strerror(err), path))
+
+    def _add_tree(self, top: str) -> List[str]:
+        # Watch top and every subdirectory below it; returns media files already present (created before the watch).
+        files = []
+        stack = [top]
+        while stack and not self._stop.is_set():
+            d = stack.pop()
+            self._add_watch(d)
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if not self._skip_dir(entry.path):
+                                    stack.append(entry.path)
+                            elif self._is_media(entry.path) and entry.is_file():
+                                files.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return files
+
+    def _forget_tree(self, top: str) -> None:
+        prefix = top + os.sep
+        for wd, p in list(self._wd_paths.items()):
+            if p == top or p.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._wd_paths.pop(wd, None)
+
+    def _move_tree(self, old: str, new: str) -> None:
+        prefix = old + os.sep
+        for wd, p in list(self._wd_paths.items()):
+            if p == old:
+                self._wd_paths[wd] = new
+            elif p.startswith(prefix):
+                self._wd_paths[wd] = new + p[len(old):]
+
+    def _run(self):
+        try:
+            self._add_tree(self._root)
+            while not self._stop.is_set():
+                if self._add_error is not None:
+                    return self._poll_instead()
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    # Quiet again: moves whose IN_MOVED_TO never came left the watched tree.
+                    if self._moved_from:
+                        changes = self._moved_out(self._moved_from.values())
+                        self._moved_from = {}
+                        self._on_changes(changes)
+                    continue
+                try:
+                    buf = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                changes = self._parse(buf)
+                if changes and self._add_error is None:
+                    self._on_changes(changes)
+        finally:
+            os.close(self._fd)
+
+    def _parse(self, buf: bytes) -> List[WatchChange]:
+        changes: List[WatchChange] = []
+        # IN_MOVED_FROM / IN_MOVED_TO of one rename can land in different reads: unmatched moves are carried over
+        # to the next read, and only reported as removes if that one does not match them either.
+        carried = self._moved_from
+        moved_from = dict(carried)
+        pos = 0
+        while pos + _INOTIFY_EVENT.size <= len(buf):
+            wd, mask, cookie, length = _INOTIFY_EVENT.unpack_from(buf, pos)
+            pos += _INOTIFY_EVENT.size
+            name = os.fsdecode(buf[pos:pos + length].rstrip(b"\0"))
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                self._moved_from = {}
+                return [("resync", "", None)]
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                if mask & IN_IGNORED:
+                    self._wd_paths.pop(wd, None)
+                continue
+            parent = self._wd_paths.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_dir)
+            elif mask & IN_MOVED_TO:
+                old, _ = moved_from.pop(cookie, (None, False))
+                if is_dir:
+                    if self._skip_dir(path):
+                        if old is not None:
+                            self._forget_tree(old)
+                            changes.append(("remove_dir", old, None))
+                        continue
+                    if old is not None:
+                        self._move_tree(old, path)
+                        for f in self._add_tree(path):
+                            changes.append(("rename", f, old + f[len(path):]))
+                    else:
+                        changes.extend(("add", f, None) for f in self._add_tree(path))
+                elif self._is_media(path):
+                    changes.append(("rename", path, old) if old is not None else ("add", path, None))
+                elif old is not None:
+                    changes.append(("remove", old, None))
+            elif is_dir and mask & IN_CREATE:
+                if not self._skip_dir(path):
+                    changes.extend(("add", f, None) for f in self._add_tree(path))
+            elif is_dir and mask & IN_DELETE:
+                changes.append(("remove_dir", path, None))
+            elif not is_dir and mask & IN_CLOSE_WRITE and self._is_media(path):
+                changes.append(("add", path, None))
+            elif not is_dir and mask & IN_DELETE:
+                changes.append(("remove", path, None))
+        self._moved_from = {c: m for c, m in moved_from.items() if c not in carried}
+        changes.extend(self._moved_out(m for c, m in moved_from.items() if c in carried))
+        return changes
+
+    def _moved_out(self, moves: Iterable[Tuple[str, bool]]) -> List[WatchChange]:
+        # Moves whose target is outside the watched tree arrive without a matching IN_MOVED_TO.
+        changes: List[WatchChange] = []
+        for old, is_dir in moves:
+            if is_dir:
+                self._forget_tree(old)
+                changes.append(("remove_dir", old, None))
+            else:
+                changes.append(("remove", old, None))
+        return changes
+
+
+def _mount_fstype(path: str) -> Optional[str]:
+    # File system type of the mount holding path, from /proc/self/mounts (longest matching mount point).
+    path = os.path.realpath(path)
+    best, fstype = "", None
+    try:
+        with open("/proc/self/mounts", "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mnt = fields[1].replace("\\040", " ")
+                if (path == mnt or path.startswith(mnt.rstrip("/") + "/")) and len(mnt) >= len(best):
+                    best, fstype = mnt, fields[2]
+    except OSError:
+        return None
+    return fstype
+
+
+def create_watcher(
+    dataset_dir: Path,
+    on_changes: Callable[[List[WatchChange]], None],
+    initial: Optional[Iterable[Path]] = None,
+    interval: Optional[float] = None,
+):
+    # watch_mode setting: "auto" (inotify on local Linux file systems, polling elsewhere) | "poll".
+    settings = load_settings(dataset_dir)
+    interval = interval or settings.get("watch_poll_seconds") or WATCH_POLL_SECONDS
+    if sys.platform.startswith("linux") and settings.get("watch_mode", "auto") != "poll":
+        fstype = _mount_fstype(str(dataset_dir))
+        if fstype in REMOTE_FILESYSTEMS:
+            _log.info("%s is on %s: polling instead of inotify", dataset_dir, fstype)
+        else:
+            try:
+                return InotifyWatcher(dataset_dir, on_changes, settings.get("scan_exclude") or [], initial, interval)
+            except (OSError, AttributeError) as ex:
+                _log.warning("inotify unavailable (%s); polling %s instead", ex, dataset_dir)
+    return PollingWatcher(dataset_dir, on_changes, initial, interval)
@@ -1,110 +1,80 @@
-# dataset_manager.py - Dataset Video Manager GUI (single-file dist)
+# dataset_manager.py - Dataset Video Manager GUI (Tk). Headless logic lives in the dataset_core package; the
+# public names this module had before are re-exported for existing callers.
 # Metadata: .data/video_metadata.json, .data/history/, .data/previews/
 # Run: python run_dataset_manager.py  or  bin\dataset_manager.bat
 
-import hashlib
-import json
+import bisect
+import math
 import os
-import re
-import shutil
+import queue
 import subprocess
 import sys
 import threading
 import tkinter as tk
-from collections import Counter
 from datetime import datetime
 from pathlib import Path
 from tkinter import ttk, filedialog, messagebox
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-try:
-    import cv2
-except ImportError:
-    cv2 = None
-try:
-    from PIL import Image, ImageTk
-except ImportError:
-    Image = None
-    ImageTk = None
-
-# --- metadata (was metadata_store) ---
-DATA_DIR_NAME = ".data"
-METADATA_FILENAME = "video_metadata.json"
-HISTORY_DIR_NAME = "history"
-
-
-def _get_metadata_path(dataset_dir: Path) -> Path:
-    return dataset_dir / DATA_DIR_NAME / METADATA_FILENAME
-
-
-def load_metadata(dataset_dir: Path) -> Dict[str, Dict[str, str]]:
-    path = _get_metadata_path(dataset_dir)
-    if not path.exists():
-        return {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return {}
-    if not isinstance(data, dict):
-        return {}
-    out = {}
-    dataset_resolved = dataset_dir.resolve()
-    for rel_key, v in data.items():
-        if isinstance(v, dict):
-            full_path = (dataset_resolved / rel_key).resolve()
-            out[str(full_path)] = {"tags": v.get("tags", "") or "", "notes": v.get("notes", "") or ""}
-    return out
-
-
-def save_metadata(dataset_dir: Path, data: Dict[str, Dict[str, str]]) -> None:
-    data_dir = dataset_dir / DATA_DIR_NAME
-    data_dir.mkdir(parents=True, exist_ok=True)
-    dataset_resolved = dataset_dir.resolve()
-    out = {}
-    for full_path_str, value in data.items():
-        p = Path(full_path_str)
-        try:
-            rel = p.relative_to(dataset_resolved)
-        except ValueError:
-            rel = p
-        out[str(rel)] = value
-    path = _get_metadata_path(dataset_dir)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
-    history_dir = data_dir / HISTORY_DIR_NAME
-    history_dir.mkdir(parents=True, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    stem, suffix = Path(METADATA_FILENAME).stem, Path(METADATA_FILENAME).suffix
-    shutil.copy2(path, history_dir / f"{stem}_{timestamp}{suffix}")
-
-
-def merge_with_video_list(
-    video_paths: List[Path], metadata: Dict[str, Dict[str, str]]
-) -> Dict[str, Dict[str, str]]:
-    result = {}
-    for p in video_paths:
-        key = str(p.resolve())
-        result[key] = metadata.get(key, {"tags": "", "notes": ""}).copy()
-        result[key].setdefault("tags", "")
-        result[key].setdefault("notes", "")
-    return result
+from dataset_core import (
+    PREVIEW_MAX_SIZE,
+    PREVIEW_PRIORITY_NEIGHBOR,
+    PREVIEW_PRIORITY_SELECTED,
+    PREVIEW_PRIORITY_VISIBLE,
+    Generation,
+    JobManager,
+    PreviewImageCache,
+    PreviewScheduler,
+    TagIndex,
+    TagQueryError,
+    WatchChange,
+    collect_orphans,
+    create_watcher,
+    decode_preview,
+    find_orphans,
+    get_metadata_store_path,
+    has_preview_backend,
+    list_history_versions,
+    load_metadata,
+    load_settings,
+    merge_with_video_list,
+    normalize_tags,
+    open_preview_store,
+    optional_import,
+    parse_tag_query,
+    preview_name_for,
+    preview_rel_path,
+    restore_history_version,
+    save_metadata,
+    scan_media,
+)
 
+# Public names this module had before the core moved to dataset_core, kept for existing callers.
+from dataset_core import (  # noqa: F401
+    DATA_DIR_NAME,
+    HISTORY_DIR_NAME,
+    IMAGE_EXTENSIONS,
+    MEDIA_EXTENSIONS,
+    METADATA_FILENAME,
+    PREVIEWS_DIR,
+    PREVIEW_EXT,
+    VIDEO_EXTENSIONS,
+    count_tags_in_metadata,
+    generate_one_preview,
+    get_all_tags,
+    get_preview_path,
+)
 
 # --- app ---
-VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".webm"}
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif"}
-MEDIA_EXTENSIONS = VIDEO_EXTENSIONS | IMAGE_EXTENSIONS
-PREVIEWS_DIR = "previews"
-PREVIEW_EXT = ".jpg"
-PREVIEW_MAX_SIZE = (320, 240)
-
-
-def normalize_tags(raw: str) -> str:
-    if not raw or not raw.strip():
-        return ""
-    parts = re.split(r"[\s;,]+", raw.strip())
-    return "; ".join(p.strip() for p in parts if p.strip())
+LOAD_POLL_MS = 50
+LOAD_CHUNK_ROWS = 500
+WATCH_APPLY_MS = 250
+FILTER_DEBOUNCE_MS = 150
+VIRTUAL_OVERSCAN_ROWS = 10
+VIRTUAL_LIST_AUTO_ROWS = 20000
+PREVIEW_PRIORITY_MS = 100
+PREVIEW_DRAIN_MS = 100
+PREVIEW_PREFETCH_ROWS = 3
 
 
 def open_with_default_player(file_path: str) -> None:
@@ -120,64 +90,307 @@ def open_with_default_player(file_path: str) -> None:
         subprocess.run(["xdg-open", s], check=False)
 
 
-def count_tags_in_metadata(metadata: Dict[str, Dict[str, str]]) -> Counter:
-    c = Counter()
-    for entry in metadata.values():
-        for tag in (t.strip() for t in (entry.get("tags") or "").split(";") if t.strip()):
-            c[tag] += 1
-    return c
+class VirtualTreeview(ttk.Treeview):
+    # Treeview that keeps all rows in Python and only materializes the visible window (+ overscan) as a fixed
+    # set of recycled "slot" items. It exposes the usual Treeview API in terms of logical item ids (the row keys),
+    # so callers use it like a plain Treeview: insert/delete/item/selection/identify_row/bbox/see/yview/...
+    # Selection, keyboard navigation and wheel scrolling are handled here on logical rows.
+    _SLOT_PREFIX = "__vslot_"
 
+    def __init__(self, master=None, overscan: int = VIRTUAL_OVERSCAN_ROWS, **kw):
+        super().__init__(master, **kw)
+        self._vrows: List[str] = []
+        self._vvalues: Dict[str, tuple] = {}
+        self._vpos: Optional[Dict[str, int]] = None
+        self._vtop = 0
+        self._voverscan = overscan
+        self._vslots: List[str] = []
+        self._vslot_keys: List[Optional[str]] = []
+        self._vslot_vals: List[Optional[tuple]] = []
+        self._vsel: Dict[str, None] = {}
+        self._vanchor: Optional[str] = None
+        self._vfocus: Optional[str] = None
+        self._vselect_callbacks: List[Callable] = []
+        self._vyscroll: Optional[Callable] = None
+        self._vrender_pending = False
+        tag = "VirtualTreeview%d" % id(self)
+        tags = list(self.bindtags())
+        self.bindtags(tuple(tags[:1] + [tag] + tags[1:]))
+        for seq, fn in (
+            ("<Configure>", lambda e: self._schedule_render()),
+            ("<Button-1>", lambda e: self._v_click(e, "set")),
+            ("<Control-Button-1>", lambda e: self._v_click(e, "toggle")),
+            ("<Shift-Button-1>", lambda e: self._v_click(e, "range")),
+            ("<MouseWheel>", lambda e: self._v_scroll_by(-3 if e.delta > 0 else 3)),
+            ("<Button-4>", lambda e: self._v_scroll_by(-3)),
+            ("<Button-5>", lambda e: self._v_scroll_by(3)),
+            ("<Up>", lambda e: self._v_key(-1, False)),
+            ("<Down>", lambda e: self._v_key(1, False)),
+            ("<Shift-Up>", lambda e: self._v_key(-1, True)),
+            ("<Shift-Down>", lambda e: self._v_key(1, True)),
+            ("<Prior>", lambda e: self._v_key(-self._page_rows(), False)),
+            ("<Next>", lambda e: self._v_key(self._page_rows(), False)),
+            ("<Home>", lambda e: self._v_key(-len(self._vrows), False)),
+            ("<End>", lambda e: self._v_key(len(self._vrows), False)),
+        ):
+            self.bind_class(tag, seq, fn)
 
-def get_all_tags(metadata: Dict[str, Dict[str, str]]) -> List[str]:
-    tags = set()
-    for entry in metadata.values():
-        for tag in (t.strip() for t in (entry.get("tags") or "").split(";") if t.strip()):
-            tags.add(tag)
-    return sorted(tags)
+    # --- logical item API ---
+    def insert(self, parent, index, iid=None, **kw):
+        if iid is None or iid in self._vvalues:
+            raise tk.TclError("Item %s already exists" % iid)
+        self._vvalues[iid] = tuple(kw.get("values", ()))
+        if index == "end":
+            self._vrows.append(iid)
+            if self._vpos is not None:
+                self._vpos[iid] = len(self._vrows) - 1
+        else:
+            self._vrows.insert(int(index), iid)
+            self._vpos = None
+        self._schedule_render()
+        return iid
 
+    def delete(self, *items):
+        gone = set(items)
+        for iid in gone:
+            self._vvalues.pop(iid, None)
+            self._vsel.pop(iid, None)
+        self._vrows = [k for k in self._vrows if k not in gone]
+        self._vpos = None
+        self._schedule_render()
 
-def scan_media(dataset_dir: Path) -> List[Path]:
-    if not dataset_dir.is_dir():
-        return []
-    return [f for f in dataset_dir.rglob("*") if f.is_file() and f.suffix.lower() in MEDIA_EXTENSIONS]
+    def detach(self, *items):
+        gone = set(items)
+        self._vrows = [k for k in self._vrows if k not in gone]
+        for iid in gone:
+            self._vsel.pop(iid, None)
+        self._vpos = None
+        self._schedule_render()
 
+    def move(self, item, parent, index):
+        if item in self._index_map():
+            self._vrows.remove(item)
+        self._vrows.insert(int(index), item)
+        self._vpos = None
+        self._schedule_render()
 
-def get_preview_path(dataset_dir: Path, file_path: Path) -> Path:
-    try:
-        rel = file_path.resolve().relative_to(dataset_dir.resolve())
-    except ValueError:
-        rel = file_path.name
-    return dataset_dir / DATA_DIR_NAME / PREVIEWS_DIR / (hashlib.md5(str(rel).encode("utf-8")).hexdigest() + PREVIEW_EXT)
+    reattach = move
 
+    def set_children(self, item, *newchildren):
+        self._vrows = list(newchildren)
+        attached = set(self._vrows)
+        for iid in [k for k in self._vsel if k not in attached]:
+            del self._vsel[iid]
+        self._vpos = None
+        self._schedule_render()
 
-def generate_one_preview(file_path: Path, preview_path: Path) -> bool:
-    suffix = file_path.suffix.lower()
-    if suffix in IMAGE_EXTENSIONS and Image is not None:
-        try:
-            preview_path.parent.mkdir(parents=True, exist_ok=True)
-            img = Image.open(file_path)
-            img = img.convert("RGB")
-            img.thumbnail(PREVIEW_MAX_SIZE, getattr(Image, "LANCZOS", Image.BICUBIC))
-            img.save(preview_path, "JPEG")
-            return True
-        except Exception:
-            return False
-    if suffix in VIDEO_EXTENSIONS and cv2 is not None:
-        cap = cv2.VideoCapture(str(file_path))
-        if not cap.isOpened():
-            return False
-        cap.set(cv2.CAP_PROP_POS_MSEC, 500)
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            ret, frame = cap.read()
-        cap.release()
-        if not ret or frame is None:
-            return False
-        preview_path.parent.mkdir(parents=True, exist_ok=True)
-        cv2.imwrite(str(preview_path), frame)
-        return True
-    return False
+    def get_children(self, item=None):
+        return tuple(self._vrows)
+
+    def exists(self, item):
+        return item in self._vvalues
+
+    def index(self, item):
+        return self._index_map()[item]
+
+    def item(self, item, option=None, **kw):
+        if item.startswith(self._SLOT_PREFIX):
+            return super().item(item, option, **kw)
+        if "values" in kw:
+            self._vvalues[item] = tuple(kw["values"])
+            self._schedule_render()
+            return None
+        if item not in self._vvalues:
+            raise tk.TclError("Item %s not found" % item)
+        d = {"text": "", "image": "", "values": list(self._vvalues[item]), "open": 0, "tags": ""}
+        return d[option] if option else d
+
+    def selection(self):
+        pos = self._index_map()
+        return tuple(sorted((k for k in self._vsel if k in pos), key=pos.__getitem__))
+
+    def selection_set(self, *items):
+        if len(items) == 1 and isinstance(items[0], (tuple, list)):
+            items = items[0]
+        self._vsel = dict.fromkeys(items)
+        if items:
+            self._vanchor = self._vfocus = items[0]
+        self._schedule_render()
+        self._fire_select()
+
+    def identify_row(self, y):
+        slot = super().identify_row(y)
+        if not slot:
+            return ""
+        return self._vslot_keys[int(slot[len(self._SLOT_PREFIX):])] or ""
+
+    def bbox(self, item, column=None):
+        for i, key in enumerate(self._vslot_keys):
+            if key == item:
+                if i >= self._page_rows():
+                    return ""
+                return super().bbox(self._vslots[i], column)
+        return ""
+
+    def see(self, item):
+        idx = self._index_map().get(item)
+        if idx is None:
+            return
+        page = self._page_rows()
+        if idx < self._vtop:
+            self._set_top(idx)
+        elif idx >= self._vtop + page:
+            self._set_top(idx - page + 1)
+
+    def visible_items(self) -> List[str]:
+        return self._vrows[self._vtop:self._vtop + self._page_rows()]
+
+    def yview(self, *args):
+        n = len(self._vrows)
+        if not args:
+            if not n:
+                return (0.0, 1.0)
+            return (self._vtop / n, min(1.0, (self._vtop + self._page_rows()) / n))
+        if args[0] == "moveto":
+            self._set_top(int(float(args[1]) * n))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self._page_rows() if args[2].startswith("page") else 1)
+            self._set_top(self._vtop + step)
+
+    def configure(self, cnf=None, **kw):
+        if "yscrollcommand" in kw:
+            self._vyscroll = kw.pop("yscrollcommand")
+            self._schedule_render()
+            if not kw and not cnf:
+                return None
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    def bind(self, sequence=None, func=None, add=None):
+        if sequence == "<<TreeviewSelect>>" and func is not None:
+            self._vselect_callbacks.append(func)
+            return None
+        return super().bind(sequence, func, add)
+
+    # --- rendering ---
+    def _index_map(self) -> Dict[str, int]:
+        if self._vpos is None:
+            self._vpos = {k: i for i, k in enumerate(self._vrows)}
+        return self._vpos
+
+    def _page_rows(self) -> int:
+        h = self.winfo_height()
+        if h <= 1:
+            return int(self.cget("height"))
+        bb = super().bbox(self._vslots[0]) if self._vslots and self._vslot_keys[0] is not None else ""
+        if bb:
+            top, row_h = bb[1], max(1, bb[3])
+        else:
+            row_h = 20
+            top = row_h + 4
+        return max(1, (h - top) // row_h)
+
+    def _set_top(self, top: int):
+        top = max(0, min(top, len(self._vrows) - self._page_rows()))
+        if top != self._vtop:
+            self._vtop = top
+            self._render()
+            self.event_generate("<<VirtualTreeviewScroll>>")
+
+    def _schedule_render(self):
+        if not self._vrender_pending:
+            self._vrender_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        self._vrender_pending = False
+        n = len(self._vrows)
+        page = self._page_rows()
+        self._vtop = max(0, min(self._vtop, n - page))
+        want = page + self._voverscan
+        while len(self._vslots) < want:
+            slot = super().insert("", "end", iid="%s%d" % (self._SLOT_PREFIX, len(self._vslots)))
+            super().detach(slot)
+            self._vslots.append(slot)
+            self._vslot_keys.append(None)
+            self._vslot_vals.append(None)
+        while len(self._vslots) > want:
+            super().delete(self._vslots.pop())
+            self._vslot_keys.pop()
+            self._vslot_vals.pop()
+        selected = []
+        for i, slot in enumerate(self._vslots):
+            idx = self._vtop + i
+            if idx < n:
+                key = self._vrows[idx]
+                vals = self._vvalues[key]
+                if self._vslot_keys[i] is None:
+                    super().move(slot, "", i)
+                if self._vslot_vals[i] is not vals:
+                    super().item(slot, values=vals)
+                self._vslot_keys[i], self._vslot_vals[i] = key, vals
+                if key in self._vsel:
+                    selected.append(slot)
+            elif self._vslot_keys[i] is not None:
+                super().detach(slot)
+                self._vslot_keys[i] = self._vslot_vals[i] = None
+        super().selection_set(selected)
+        if self._vyscroll is not None:
+            self._vyscroll(*self.yview())
+
+    def _fire_select(self):
+        for cb in self._vselect_callbacks:
+            cb(None)
+
+    # --- interaction ---
+    def _v_click(self, event, mode: str):
+        if super().identify_region(event.x, event.y) not in ("cell", "tree"):
+            return None
+        key = self.identify_row(event.y)
+        if not key:
+            return "break"
+        self.focus_set()
+        pos = self._index_map()
+        if mode == "toggle":
+            if key in self._vsel:
+                del self._vsel[key]
+            else:
+                self._vsel[key] = None
+            self._vanchor = key
+        elif mode == "range" and self._vanchor in pos:
+            a, b = sorted((pos[self._vanchor], pos[key]))
+            self._vsel = dict.fromkeys(self._vrows[a:b + 1])
+        else:
+            self._vsel = {key: None}
+            self._vanchor = key
+        self._vfocus = key
+        self._render()
+        self._fire_select()
+        return "break"
+
+    def _v_key(self, delta: int, extend: bool):
+        if not self._vrows:
+            return "break"
+        pos = self._index_map()
+        cur = pos.get(self._vfocus, self._vtop - 1 if delta > 0 else self._vtop)
+        new = max(0, min(len(self._vrows) - 1, cur + delta))
+        key = self._vrows[new]
+        if extend and self._vanchor in pos:
+            a, b = sorted((pos[self._vanchor], new))
+            self._vsel = dict.fromkeys(self._vrows[a:b + 1])
+        else:
+            self._vsel = {key: None}
+            self._vanchor = key
+        self._vfocus = key
+        self.see(key)
+        self._render()
+        self._fire_select()
+        return "break"
+
+    def _v_scroll_by(self, rows: int):
+        self._set_top(self._vtop + rows)
+        return "break"
 
 
 class EditDialog:
@@ -227,12 +440,34 @@ class DatasetManagerApp:
         self._video_paths = []
         self._metadata = {}
         self._export_selected = set()
+        self._dirty = set()
+        self._tag_index = TagIndex()
         self._tag_filter = None
+        self._tag_query = None
+        self._filter_after = None
+        self._path_keys = {}
+        self._row_static = {}
+        self._tree_rows = {}
+        self._tree_order = []
         self._inline_entry = None
         self._inline_iid = None
         self._inline_col = None
         self._preview_photo = None
+        self._jobs = JobManager()
+        self._load_gen = None
+        self._loaded = False
+        self._stream_filter = None
+        self._stream_visible = None
+        self._watcher = None
+        self._previews = None
+        self._priority_after = None
+        self._preview_results = queue.Queue()
+        self._drain_after = None
+        self._preview_store = None
+        self._preview_cache = None
+        self._preview_names = {}
         self._build_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _build_ui(self):
         top = ttk.Frame(self.root, padding=5)
@@ -248,14 +483,21 @@ class DatasetManagerApp:
         ttk.Button(br, text="Save", command=self._on_save).pack(side="left", padx=2)
         ttk.Button(br, text="Export", command=self._on_export).pack(side="left", padx=2)
         ttk.Button(br, text="Delete", command=self._on_delete).pack(side="left", padx=2)
+        ttk.Button(br, text="History", command=self._on_history).pack(side="left", padx=2)
+        ttk.Button(br, text="Clean up", command=self._on_gc).pack(side="left", padx=2)
+        self._watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(br, text="Watch", variable=self._watch_var, command=self._on_toggle_watch).pack(side="left", padx=(10, 2))
+        self._load_label = ttk.Label(br, text="")
+        self._load_cancel_btn = ttk.Button(br, text="Cancel", command=self._on_cancel_load)
         filter_f = ttk.Frame(top)
         filter_f.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
         filter_f.columnconfigure(1, weight=1)
-        ttk.Label(filter_f, text="Filter by tag:").grid(row=0, column=0, sticky="w", padx=(0, 5))
+        ttk.Label(filter_f, text="Filter by tag (AND / OR / NOT, parentheses, prefix*):").grid(row=0, column=0, sticky="w", padx=(0, 5))
         self._filter_var = tk.StringVar()
         self._filter_entry = ttk.Entry(filter_f, textvariable=self._filter_var, width=40)
         self._filter_entry.grid(row=0, column=1, sticky="ew", padx=0)
-        self._filter_entry.bind("<Return>", lambda e: self._apply_tag_filter())
+        self._filter_entry.bind("<Return>", lambda e: self._apply_tag_filter(force=True))
+        self._filter_entry.bind("<KeyRelease>", self._on_filter_key)
         self._filter_entry.bind("<FocusIn>", lambda e: self._on_filter_focus_in())
         content = ttk.Frame(self.root, padding=5)
         content.grid(row=1, column=0, sticky="nsew")
@@ -267,24 +509,14 @@ class DatasetManagerApp:
         table_f.grid(row=0, column=0, sticky="nsew")
         table_f.columnconfigure(0, weight=1)
         table_f.rowconfigure(0, weight=1)
-        cols = ("check", "filename", "path", "tags", "notes")
-        self._tree = ttk.Treeview(table_f, columns=cols, show="headings", selectmode="extended", height=20)
-        self._tree.heading("check", text="")
-        self._tree.heading("filename", text="Filename")
-        self._tree.heading("path", text="Path (relative to selected folder)")
-        self._tree.heading("tags", text="Tags (, or ; or space separated)")
-        self._tree.heading("notes", text="Notes")
-        self._tree.column("check", width=36)
-        self._tree.column("filename", width=120)
-        self._tree.column("path", width=280)
-        self._tree.column("tags", width=150)
-        self._tree.column("notes", width=200)
+        self._plain_tree = self._make_tree(table_f, ttk.Treeview)
+        self._virtual_tree = self._make_tree(table_f, VirtualTreeview)
+        self._virtual_tree.bind("<<VirtualTreeviewScroll>>", lambda e: self._commit_inline())
+        self._tree = self._plain_tree
         self._tree.grid(row=0, column=0, sticky="nsew")
-        self._tree.bind("<Button-1>", self._on_tree_click)
-        self._tree.bind("<Double-1>", self._on_tree_double_click)
-        sb = ttk.Scrollbar(table_f, orient="vertical", command=self._tree.yview)
-        sb.grid(row=0, column=1, sticky="ns")
-        self._tree.configure(yscrollcommand=sb.set)
+        self._tree_sb = ttk.Scrollbar(table_f, orient="vertical", command=self._tree.yview)
+        self._tree_sb.grid(row=0, column=1, sticky="ns")
+        self._tree.configure(yscrollcommand=self._on_tree_yscroll)
         prev_f = ttk.LabelFrame(content, text="Preview", padding=5)
         prev_f.grid(row=0, column=1, sticky="nsew", padx=(10, 0))
         content.columnconfigure(1, weight=0, minsize=PREVIEW_MAX_SIZE[0] + 20)
@@ -294,7 +526,6 @@ class DatasetManagerApp:
         self._preview_label.grid(row=0, column=0, pady=(0, 5))
         self._preview_image_label = tk.Label(prev_f, text="", bg="#e0e0e0", width=PREVIEW_MAX_SIZE[0] // 8, height=PREVIEW_MAX_SIZE[1] // 8)
         self._preview_image_label.grid(row=1, column=0, sticky="nsew")
-        self._tree.bind("<<TreeviewSelect>>", lambda e: self._on_selection_change())
         status_f = ttk.Frame(self.root, padding=(5, 5))
         status_f.grid(row=2, column=0, sticky="ew")
         self.root.rowconfigure(2, minsize=110)
@@ -309,6 +540,47 @@ class DatasetManagerApp:
         self._status_untagged = ttk.Label(status_f, text="", font=("TkDefaultFont", 8))
         self._status_untagged.grid(row=3, column=0, sticky="w", padx=0, pady=1)
 
+    def _make_tree(self, parent, cls):
+        cols = ("check", "filename", "path", "tags", "notes")
+        tree = cls(parent, columns=cols, show="headings", selectmode="extended", height=20)
+        tree.heading("check", text="")
+        tree.heading("filename", text="Filename")
+        tree.heading("path", text="Path (relative to selected folder)")
+        tree.heading("tags", text="Tags (, or ; or space separated)")
+        tree.heading("notes", text="Notes")
+        tree.column("check", width=36)
+        tree.column("filename", width=120)
+        tree.column("path", width=280)
+        tree.column("tags", width=150)
+        tree.column("notes", width=200)
+        tree.bind("<Button-1>", self._on_tree_click)
+        tree.bind("<Double-1>", self._on_tree_double_click)
+        tree.bind("<<TreeviewSelect>>", lambda e: self._on_selection_change())
+        return tree
+
+    def _use_virtual_tree(self, virtual: bool):
+        # Swap between the plain Treeview and the VirtualTreeview (same cell, same scrollbar).
+        new = self._virtual_tree if virtual else self._plain_tree
+        if new is self._tree:
+            return
+        self._cancel_inline()
+        self._clear_tree()
+        self._tree.grid_remove()
+        self._tree = new
+        self._tree.grid(row=0, column=0, sticky="nsew")
+        self._tree_sb.configure(command=self._tree.yview)
+        self._tree.configure(yscrollcommand=self._on_tree_yscroll)
+
+    def _on_tree_yscroll(self, first, last):
+        self._tree_sb.set(first, last)
+        self._schedule_preview_priorities()
+
+    def _want_virtual_tree(self, rows: int) -> bool:
+        mode = load_settings(self._dataset_dir).get("virtual_list", "auto") if self._dataset_dir else "auto"
+        if mode == "auto":
+            return rows > VIRTUAL_LIST_AUTO_ROWS
+        return bool(mode)
+
     def _on_select_dir(self):
         path = filedialog.askdirectory(title="Select dataset directory")
         if path:
@@ -317,8 +589,13 @@ class DatasetManagerApp:
             self._refresh_table()
 
     def _refresh_table(self):
-        for i in self._tree.get_children():
-            self._tree.delete(i)
+        self._cancel_jobs()
+        self._loaded = False
+        self._stop_watch()
+        self._close_preview_store()
+        self._clear_tree()
+        self._path_keys = {}
+        self._row_static = {}
         if not self._dataset_dir or not self._dataset_dir.is_dir():
             self._status.config(text="Select a directory to list videos and images.")
             self._status_tags.config(text="")
@@ -327,33 +604,282 @@ class DatasetManagerApp:
             self._clear_preview_image()
             return
         self._export_selected.clear()
-        self._video_paths = sorted(scan_media(self._dataset_dir))
-        self._metadata = merge_with_video_list(self._video_paths, load_metadata(self._dataset_dir))
-        self._populate_tree()
+        self._dirty.clear()
+        self._video_paths = []
+        self._metadata = {}
+        self._tag_index = TagIndex()
+        self._start_load()
+
+    def _start_load(self):
+        # Scan + merge run on a worker thread; results come back through a queue polled from the Tk loop.
+        gen, dd, q = self._jobs.new_generation(), self._dataset_dir, queue.Queue()
+        self._load_gen = gen
+        self._load_label.config(text="Scanning...")
+        self._load_label.pack(side="left", padx=(10, 2))
+        self._load_cancel_btn.pack(side="left", padx=2)
+        self._status.config(text="Loading %s ..." % dd)
+
+        def work(gen):
+            try:
+                paths = scan_media(dd, use_cache=True, progress=lambda n: q.put(("progress", n)), cancel=gen)
+                if gen.is_set():
+                    return
+                q.put(("phase", "Loading metadata..."))
+                keys = {p: str(p.resolve()) for p in paths}
+                metadata = merge_with_video_list(paths, load_metadata(dd), keys)
+                index = TagIndex(metadata)
+                if not gen.is_set():
+                    q.put(("done", paths, metadata, index, keys))
+            except Exception as ex:
+                q.put(("error", ex))
+
+        self._jobs.spawn(gen, work)
+        self.root.after(LOAD_POLL_MS, lambda: self._poll_load(gen, q))
+
+    def _poll_load(self, gen: Generation, q: "queue.Queue"):
+        if not self._jobs.is_current(gen):
+            return
+        while True:
+            try:
+                msg = q.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] == "progress":
+                self._load_label.config(text="Scanning... %d file(s) found" % msg[1])
+            elif msg[0] == "phase":
+                self._load_label.config(text=msg[1])
+            elif msg[0] == "error":
+                self._end_load()
+                self._status.config(text="Failed to load: %s" % msg[1])
+                return
+            else:
+                self._video_paths, self._metadata, self._tag_index, self._path_keys = msg[1:5]
+                self._loaded = True
+                self._use_virtual_tree(self._want_virtual_tree(len(self._video_paths)))
+                self._stream_filter = self._tag_filter
+                self._stream_visible = self._filter_keys()
+                self._stream_rows(gen, 0)
+                return
+        self.root.after(LOAD_POLL_MS, lambda: self._poll_load(gen, q))
+
+    def _stream_rows(self, gen: Generation, start: int):
+        if not self._jobs.is_current(gen):
+            return
+        total = len(self._video_paths)
+        # The virtual list only stores rows in Python, so it takes them all at once.
+        end = total if self._tree is self._virtual_tree else min(start + LOAD_CHUNK_ROWS, total)
+        self._insert_rows(self._video_paths[start:end], self._stream_visible)
+        if end < total:
+            self._load_label.config(text="Loading table... %d / %d" % (end, total))
+            self.root.after(1, lambda: self._stream_rows(gen, end))
+            return
+        self._end_load()
+        if self._tag_filter != self._stream_filter:
+            self._populate_tree()
+        self._show_row_count()
         self._update_status_after_load()
         self._start_preview_generation()
+        if self._watch_var.get():
+            self._start_watch()
 
-    def _populate_tree(self):
-        for i in self._tree.get_children():
-            self._tree.delete(i)
-        if not self._video_paths:
+    def _on_toggle_watch(self):
+        if self._watch_var.get():
+            if self._dataset_dir and not self._loading():
+                self._start_watch()
+        else:
+            self._stop_watch()
+
+    def _start_watch(self):
+        # Watcher threads only enqueue; changes are applied on the Tk thread by _poll_watch.
+        self._stop_watch()
+        q = queue.Queue()
+        self._watcher = create_watcher(self._dataset_dir, q.put, initial=self._video_paths)
+        self._watcher.start()
+        self.root.after(WATCH_APPLY_MS, lambda w=self._watcher: self._poll_watch(w, q))
+
+    def _stop_watch(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _poll_watch(self, watcher, q: "queue.Queue"):
+        if watcher is not self._watcher:
             return
-        keyword = (self._tag_filter or "").strip().lower()
-        for p in self._video_paths:
-            key = str(p.resolve())
-            m = self._metadata.get(key, {"tags": "", "notes": ""})
-            if keyword:
-                tags_str = (m.get("tags") or "").lower()
-                if keyword not in tags_str:
-                    continue
+        changes = []
+        while True:
+            try:
+                changes.extend(q.get_nowait())
+            except queue.Empty:
+                break
+        if changes:
+            self._apply_watch_changes(changes)
+        if watcher is self._watcher:
+            self.root.after(WATCH_APPLY_MS, lambda: self._poll_watch(watcher, q))
+
+    def _apply_watch_changes(self, changes: List[WatchChange]):
+        added = []
+        for op, path, old in changes:
+            if op == "resync":
+                self._refresh_table()
+                return
+            if op == "remove":
+                self._remove_path(Path(path))
+            elif op == "remove_dir":
+                for p in self._paths_under(Path(path)):
+                    self._remove_path(p)
+            else:
+                entry, checked = self._remove_path(Path(old)) if op == "rename" else (None, False)
+                p = Path(path)
+                if self._add_path(p, entry, checked):
+                    added.append(p)
+        self._populate_tree()
+        if added:
+            self._start_preview_generation(added)
+        self._update_status_after_load()
+
+    def _paths_under(self, d: Path) -> List[Path]:
+        # _video_paths is sorted, so everything below d directly follows it.
+        out = []
+        i = bisect.bisect_left(self._video_paths, d)
+        while i < len(self._video_paths) and d in self._video_paths[i].parents:
+            out.append(self._video_paths[i])
+            i += 1
+        return out
+
+    def _remove_path(self, p: Path) -> Tuple[Optional[Dict[str, str]], bool]:
+        i = bisect.bisect_left(self._video_paths, p)
+        if i >= len(self._video_paths) or self._video_paths[i] != p:
+            return None, False
+        del self._video_paths[i]
+        key = self._path_key(p)
+        self._path_keys.pop(p, None)
+        self._row_static.pop(key, None)
+        if self._inline_iid == key:
+            self._cancel_inline()
+        checked = key in self._export_selected
+        self._export_selected.discard(key)
+        entry = self._metadata.pop(key, None)
+        self._tag_index.remove(key)
+        if entry is not None:
+            self._dirty.add(key)
+        return entry, checked
+
+    def _add_path(self, p: Path, entry: Optional[Dict[str, str]], checked: bool) -> bool:
+        i = bisect.bisect_left(self._video_paths, p)
+        if i < len(self._video_paths) and self._video_paths[i] == p:
+            return False
+        self._video_paths.insert(i, p)
+        key = self._path_key(p)
+        self._metadata[key] = entry if entry is not None else {"tags": "", "notes": ""}
+        self._tag_index.set(key, self._metadata[key].get("tags"))
+        if entry is not None:
+            self._dirty.add(key)
+        if checked:
+            self._export_selected.add(key)
+        return True
+
+    def _loading(self) -> bool:
+        return self._load_gen is not None
+
+    def _end_load(self):
+        self._load_gen = None
+        self._load_label.pack_forget()
+        self._load_cancel_btn.pack_forget()
+
+    def _cancel_jobs(self):
+        # Cancels all work of the current generation: the scan/merge worker and the preview scheduler.
+        self._jobs.cancel()
+        self._previews = None
+        if self._loading():
+            self._end_load()
+
+    def _on_cancel_load(self):
+        if not self._loading():
+            return
+        self._cancel_jobs()
+        shown = len(self._tree_order)
+        self._status.config(text="Load cancelled (%d of %d file(s) shown)." % (shown, len(self._video_paths)))
+
+    def _filter_keys(self) -> Optional[set]:
+        # Keys matching the current tag query (None = no filter).
+        if self._tag_query is None:
+            return None
+        return self._tag_index.query(self._tag_query)
+
+    def _path_key(self, p: Path) -> str:
+        key = self._path_keys.get(p)
+        if key is None:
+            key = self._path_keys[p] = str(p.resolve())
+        return key
+
+    def _insert_rows(self, paths: List[Path], visible: Optional[set]):
+        for p in paths:
+            key = self._path_key(p)
+            if visible is not None and key not in visible:
+                continue
+            vals = self._row_values(p, key)
+            self._tree.insert("", "end", values=vals, iid=key)
+            self._tree_rows[key] = vals
+            self._tree_order.append(key)
+
+    def _row_values(self, p: Path, key: str) -> tuple:
+        static = self._row_static.get(key)
+        if static is None:
             try:
                 rp = p.relative_to(self._dataset_dir)
             except ValueError:
                 rp = p
-            check_mark = "\u2611" if key in self._export_selected else "\u2610"
-            self._tree.insert("", "end", values=(check_mark, p.name, str(rp), m.get("tags", ""), m.get("notes", "")), iid=key)
+            static = self._row_static[key] = (p.name, str(rp))
+        m = self._metadata.get(key, {"tags": "", "notes": ""})
+        check_mark = "\u2611" if key in self._export_selected else "\u2610"
+        return (check_mark, static[0], static[1], m.get("tags", ""), m.get("notes", ""))
+
+    def _set_row_values(self, key: str, vals) -> None:
+        vals = tuple(vals)
+        self._tree.item(key, values=vals)
+        self._tree_rows[key] = vals
+
+    def _clear_tree(self):
+        # Deletes attached and detached rows alike.
+        if self._tree_rows:
+            self._tree.delete(*self._tree_rows)
+        self._tree_rows = {}
+        self._tree_order = []
+
+    def _populate_tree(self):
+        # Reconcile Tk's rows with the rows that should be shown: rows are created once and then only detached /
+        # reattached (one set_children call) when the filter changes; values are rewritten only where they differ.
+        visible = self._filter_keys()
+        tree, rows = self._tree, self._tree_rows
+        desired = []
+        for p in self._video_paths:
+            key = self._path_key(p)
+            if visible is not None and key not in visible:
+                continue
+            desired.append(key)
+            vals = self._row_values(p, key)
+            old = rows.get(key)
+            if old is None:
+                tree.insert("", "end", values=vals, iid=key)
+                rows[key] = vals
+                self._tree_order.append(key)
+            elif old != vals:
+                tree.item(key, values=vals)
+                rows[key] = vals
+        stale = [k for k in rows if k not in self._metadata]
+        if stale:
+            tree.delete(*stale)
+            for k in stale:
+                del rows[k]
+            self._tree_order = [k for k in self._tree_order if k in rows]
+        if desired != self._tree_order:
+            tree.set_children("", *desired)
+            self._tree_order = desired
+        self._show_row_count()
+
+    def _show_row_count(self):
         if self._tag_filter and (self._tag_filter or "").strip():
-            shown = len(self._tree.get_children())
+            shown = len(self._tree_order)
             self._status.config(text="%d file(s) shown (filtered by tag, %d total)." % (shown, len(self._video_paths)))
         else:
             self._status.config(text="%d file(s) (videos and images, including subfolders)." % len(self._video_paths))
@@ -361,42 +887,86 @@ class DatasetManagerApp:
     def _update_status_after_load(self):
         if not self._metadata:
             return
-        tc = count_tags_in_metadata(self._metadata)
+        self._show_tag_stats()
+        self._show_row_count()
+
+    def _show_tag_stats(self) -> List[Tuple[str, int]]:
+        tc = sorted(self._tag_index.counts().items(), key=lambda x: (-x[1], x[0]))
         if tc:
-            self._status_tags.config(text="Tag counts: " + ", ".join("%s (%d)" % (t, c) for t, c in sorted(tc.items(), key=lambda x: (-x[1], x[0]))))
+            self._status_tags.config(text="Tag counts: " + ", ".join("%s (%d)" % (t, c) for t, c in tc))
         else:
             self._status_tags.config(text="Tag counts: (none)")
-        n = sum(1 for v in self._metadata.values() if not (v.get("tags") or "").strip())
-        self._status_untagged.config(text="Files without tags: %d" % n)
-        if not (self._tag_filter and (self._tag_filter or "").strip()):
-            self._status.config(text="%d file(s) (videos and images, including subfolders)." % len(self._video_paths))
-        else:
-            shown = len(self._tree.get_children())
-            self._status.config(text="%d file(s) shown (filtered by tag, %d total)." % (shown, len(self._video_paths)))
+        self._status_untagged.config(text="Files without tags: %d" % self._tag_index.untagged_count())
+        return tc
 
     def _on_selection_change(self):
+        self._schedule_preview_priorities()
+        self._show_selected_preview()
+
+    def _show_selected_preview(self):
         sel = self._tree.selection()
         if not sel or not self._dataset_dir:
             self._preview_label.config(text="Select a file.")
             self._clear_preview_image()
             return
         iid = sel[0]
-        pp = get_preview_path(self._dataset_dir, Path(iid))
-        if pp.exists():
-            self._show_preview_image(str(pp))
+        if optional_import("PIL.ImageTk") is None:
+            self._preview_label.config(text=Path(iid).name)
+            self._preview_image_label.config(image="", text="(PIL required)")
+            return
+        img = self._get_preview_cache().get(self._preview_name_for(iid))
+        if img is not None:
+            self._show_preview_image(img)
             self._preview_label.config(text=Path(iid).name)
         else:
             self._preview_label.config(text=Path(iid).name + " (no preview yet)")
             self._clear_preview_image()
+        self._prefetch_previews(iid)
 
-    def _show_preview_image(self, path: str):
-        if Image is None or ImageTk is None:
-            self._preview_image_label.config(image="", text="(PIL required)")
+    def _prefetch_previews(self, iid: str):
+        # Decode the next / previous few rows (in view order) ahead of arrow-key browsing.
+        rows = self._tree_order
+        try:
+            i = self._tree.index(iid)
+        except tk.TclError:
             return
+        names = []
+        for d in range(1, PREVIEW_PREFETCH_ROWS + 1):
+            for j in (i + d, i - d):
+                if 0 <= j < len(rows):
+                    names.append(self._preview_name_for(rows[j]))
+        self._get_preview_cache().prefetch(names)
+
+    def _preview_name_for(self, key: str) -> str:
+        name = self._preview_names.get(key)
+        if name is None:
+            name = self._preview_names[key] = preview_name_for(preview_rel_path(self._dataset_dir, Path(key)))
+        return name
+
+    def _get_preview_store(self):
+        if self._preview_store is None:
+            self._preview_store = open_preview_store(self._dataset_dir)
+        return self._preview_store
+
+    def _get_preview_cache(self) -> PreviewImageCache:
+        if self._preview_cache is None:
+            store = self._get_preview_store()
+            mb = load_settings(self._dataset_dir).get("preview_cache_mb", 64)
+            self._preview_cache = PreviewImageCache(lambda name: decode_preview(store.get(name)), int(mb * 1024 * 1024))
+        return self._preview_cache
+
+    def _close_preview_store(self):
+        if self._preview_cache is not None:
+            self._preview_cache.close()
+            self._preview_cache = None
+        if self._preview_store is not None:
+            self._preview_store.close()
+            self._preview_store = None
+        self._preview_names = {}
+
+    def _show_preview_image(self, img):
         try:
-            img = Image.open(path)
-            img.thumbnail(PREVIEW_MAX_SIZE, getattr(Image, "LANCZOS", Image.BICUBIC))
-            self._preview_photo = ImageTk.PhotoImage(img)
+            self._preview_photo = optional_import("PIL.ImageTk").PhotoImage(img)
             self._preview_image_label.config(image=self._preview_photo, text="")
         except Exception:
             self._preview_image_label.config(image="", text="(load error)")
@@ -405,32 +975,99 @@ class DatasetManagerApp:
         self._preview_photo = None
         self._preview_image_label.config(image="", text="", bg="#e0e0e0")
 
-    def _start_preview_generation(self):
-        if not self._dataset_dir or not self._video_paths or (cv2 is None and Image is None):
+    def _start_preview_generation(self, paths: Optional[List[Path]] = None):
+        if not self._dataset_dir or not self._video_paths or not has_preview_backend():
+            return
+        gen = self._jobs.current()
+        if not self._jobs.is_current(gen):
             return
-        dd, vps = self._dataset_dir, list(self._video_paths)
-        def gen():
-            for p in vps:
-                pp = get_preview_path(dd, p)
-                if pp.exists():
-                    continue
-                generate_one_preview(p, pp)
-                self.root.after(0, lambda pth=pp: self._maybe_update_preview(pth))
-        threading.Thread(target=gen, daemon=True).start()
+        if self._previews is None:
+            workers = load_settings(self._dataset_dir).get("preview_workers", "auto")
+            self._previews = PreviewScheduler(
+                self._dataset_dir,
+                lambda key, pp, ok: self._on_preview_done(gen, key, ok),
+                None if workers == "auto" else int(workers),
+                self._get_preview_store(),
+            )
+            self._jobs.on_cancel(gen, self._previews.stop)
+            if self._drain_after is None:
+                self._drain_after = self.root.after(PREVIEW_DRAIN_MS, self._drain_preview_results)
+        self._previews.submit([self._path_key(p) for p in (self._video_paths if paths is None else paths)])
+        self._update_preview_priorities()
 
-    def _maybe_update_preview(self, new_path: Path):
-        sel = self._tree.selection()
-        if not sel or not self._dataset_dir:
+    def _on_preview_done(self, gen: Generation, key: str, ok: bool):
+        # Called from a pool thread.
+        if ok:
+            self._preview_results.put((gen, key))
+
+    def _drain_preview_results(self):
+        # Pool threads only enqueue (generation, key) of finished previews; this timer applies them in one pass.
+        # Only the selected row shows a preview, so completions for any other row need no UI work at all.
+        self._drain_after = None
+        done = set()
+        while True:
+            try:
+                gen, key = self._preview_results.get_nowait()
+            except queue.Empty:
+                break
+            if self._jobs.is_current(gen):
+                done.add(key)
+                name = self._preview_names.get(key)
+                if name is not None and self._preview_cache is not None:
+                    self._preview_cache.discard(name)  # regenerated
+        if done:
+            sel = self._tree.selection()
+            if sel and sel[0] in done:
+                self._show_selected_preview()
+        if self._previews is not None:
+            self._drain_after = self.root.after(PREVIEW_DRAIN_MS, self._drain_preview_results)
+
+    def _schedule_preview_priorities(self):
+        if self._previews is not None and self._priority_after is None:
+            self._priority_after = self.root.after(PREVIEW_PRIORITY_MS, self._update_preview_priorities)
+
+    def _update_preview_priorities(self):
+        # Selected rows first, then the rows in view, then one page above and below; everything else keeps its order.
+        if self._priority_after is not None:
+            self.root.after_cancel(self._priority_after)
+            self._priority_after = None
+        if self._previews is None:
             return
-        iid = sel[0]
-        if new_path.resolve() == get_preview_path(self._dataset_dir, Path(iid)).resolve():
-            self._show_preview_image(str(new_path))
-            self._preview_label.config(text=Path(iid).name)
+        rows = self._tree_order
+        first, last = self._tree.yview()
+        lo, hi = int(float(first) * len(rows)), int(math.ceil(float(last) * len(rows)))
+        page = max(1, hi - lo)
+        prio = dict.fromkeys(rows[max(0, lo - page):hi + page], PREVIEW_PRIORITY_NEIGHBOR)
+        prio.update(dict.fromkeys(rows[lo:hi], PREVIEW_PRIORITY_VISIBLE))
+        prio.update(dict.fromkeys(self._tree.selection()[:page], PREVIEW_PRIORITY_SELECTED))
+        self._previews.reprioritize(prio)
 
-    def _apply_tag_filter(self):
+    def _on_filter_key(self, e):
+        # Live filtering: re-filter once typing pauses; Return still applies immediately.
+        if e.keysym in ("Return", "KP_Enter"):
+            return
+        if self._filter_after is not None:
+            self.root.after_cancel(self._filter_after)
+        self._filter_after = self.root.after(FILTER_DEBOUNCE_MS, self._apply_tag_filter)
+
+    def _apply_tag_filter(self, force: bool = False):
+        # force (Enter) always re-filters, so rows whose tags were edited since are re-evaluated.
+        if self._filter_after is not None:
+            self.root.after_cancel(self._filter_after)
+            self._filter_after = None
         raw = self._filter_var.get().strip()
+        if not force and raw == (self._tag_filter or ""):
+            if self._video_paths and not self._loading():
+                self._show_row_count()
+            return
+        try:
+            query = parse_tag_query(raw)
+        except TagQueryError as ex:
+            self._status.config(text="Invalid tag filter: %s" % ex)
+            return
         self._tag_filter = raw if raw else None
-        if not self._video_paths:
+        self._tag_query = query
+        if not self._video_paths or self._loading():
             return
         self._populate_tree()
 
@@ -439,7 +1076,7 @@ class DatasetManagerApp:
             return
         if not self._metadata:
             return
-        tags = get_all_tags(self._metadata)
+        tags = self._tag_index.tags()
         if not tags:
             return
         self._show_tag_picker_popup(tags)
@@ -505,14 +1142,14 @@ class DatasetManagerApp:
         col = self._tree.identify_column(e.x)
         if col == "#1":
             if iid:
-                vals = list(self._tree.item(iid)["values"])
+                vals = list(self._tree_rows[iid])
                 if iid in self._export_selected:
                     self._export_selected.discard(iid)
                     vals[0] = "\u2610"
                 else:
                     self._export_selected.add(iid)
                     vals[0] = "\u2611"
-                self._tree.item(iid, values=vals)
+                self._set_row_values(iid, vals)
             return
         if col == "#4":
             self._start_inline_edit(iid, 3)
@@ -523,7 +1160,7 @@ class DatasetManagerApp:
         bbox = self._tree.bbox(iid, col_index)
         if not bbox:
             return
-        vals = list(self._tree.item(iid)["values"])
+        vals = self._tree_rows.get(iid, ())
         cur = vals[col_index] if col_index < len(vals) else ""
         self._inline_entry = tk.Entry(self._tree)
         self._inline_entry.insert(0, cur)
@@ -552,16 +1189,18 @@ class DatasetManagerApp:
         self._inline_entry.destroy()
         self._inline_entry = self._inline_iid = self._inline_col = None
         self._metadata.setdefault(iid, {"tags": "", "notes": ""})
+        field = "tags" if col == 3 else "notes"
         if col == 3:
             val = normalize_tags(val)
-            self._metadata[iid]["tags"] = val
-        else:
-            self._metadata[iid]["notes"] = val
-        vals = list(self._tree.item(iid)["values"])
-        while len(vals) <= col:
-            vals.append("")
-        vals[col] = val
-        self._tree.item(iid, values=vals)
+        if self._metadata[iid].get(field, "") != val:
+            self._metadata[iid][field] = val
+            self._dirty.add(iid)
+            if col == 3:
+                self._tag_index.set(iid, val)
+        if iid in self._tree_rows:
+            vals = list(self._tree_rows[iid])
+            vals[col] = val
+            self._set_row_values(iid, vals)
 
     def _cancel_inline(self):
         if self._inline_entry is None:
@@ -575,38 +1214,191 @@ class DatasetManagerApp:
             messagebox.showinfo("Info", "Select a row to edit.")
             return
         iid = sel[0]
-        it = self._tree.item(iid)
-        tags, notes = it["values"][3], it["values"][4]
+        vals = self._tree_rows[iid]
+        tags, notes = vals[3], vals[4]
         dlg = EditDialog(self.root, tags=tags, notes=notes, title="Edit tags and notes")
         res = dlg.run()
         if res is not None:
+            if self._metadata.get(iid) != res:
+                self._dirty.add(iid)
             self._metadata[iid] = res
-            self._tree.item(iid, values=(it["values"][0], it["values"][1], it["values"][2], res["tags"], res["notes"]))
+            self._tag_index.set(iid, res["tags"])
+            self._set_row_values(iid, vals[:3] + (res["tags"], res["notes"]))
 
     def _on_save(self):
         if not self._dataset_dir:
             messagebox.showinfo("Info", "Please select a directory first.")
             return
+        if self._loading():
+            messagebox.showinfo("Info", "Please wait until the directory has finished loading.")
+            return
+        if not self._loaded:
+            # A cancelled or failed load leaves no metadata to save; saving would replace the stored tags.
+            messagebox.showinfo("Info", "The directory was not fully loaded. Press Refresh before saving.")
+            return
+        if not self._dirty:
+            self._status.config(text="No changes to save.")
+            return
         try:
-            save_metadata(self._dataset_dir, self._metadata)
-            tc = count_tags_in_metadata(self._metadata)
+            save_metadata(self._dataset_dir, self._metadata, dirty=self._dirty)
+            self._dirty.clear()
+            sp = get_metadata_store_path(self._dataset_dir)
+            self._status.config(text="Saved to %s" % sp)
+            tc = self._show_tag_stats()
             if tc:
                 print("Tag counts (saved):")
-                for t, c in sorted(tc.items(), key=lambda x: (-x[1], x[0])):
+                for t, c in tc:
                     print("  %s: %d" % (t, c))
             else:
                 print("Tag counts (saved): (none)")
-            sp = self._dataset_dir / DATA_DIR_NAME / METADATA_FILENAME
-            self._status.config(text="Saved to %s" % sp)
-            if tc:
-                self._status_tags.config(text="Tag counts: " + ", ".join("%s (%d)" % (t, c) for t, c in sorted(tc.items(), key=lambda x: (-x[1], x[0]))))
-            else:
-                self._status_tags.config(text="Tag counts: (none)")
-            n = sum(1 for v in self._metadata.values() if not (v.get("tags") or "").strip())
-            self._status_untagged.config(text="Files without tags: %d" % n)
         except OSError as ex:
             messagebox.showerror("Error", "Failed to save: %s" % ex)
 
+    def _on_history(self):
+        if not self._dataset_dir:
+            messagebox.showinfo("Info", "Please select a directory first.")
+            return
+        versions = list_history_versions(self._dataset_dir)
+        if not versions:
+            messagebox.showinfo("Info", "No saved history yet.")
+            return
+        versions.reverse()
+        pop = tk.Toplevel(self.root)
+        pop.title("Metadata history")
+        pop.transient(self.root)
+        lb = tk.Listbox(pop, height=min(15, len(versions)), width=40, font=("TkDefaultFont", 10))
+        lb.grid(row=0, column=0, sticky="nsew")
+        sb = ttk.Scrollbar(pop, orient="vertical", command=lb.yview)
+        sb.grid(row=0, column=1, sticky="ns")
+        lb.configure(yscrollcommand=sb.set)
+        pop.columnconfigure(0, weight=1)
+        pop.rowconfigure(0, weight=1)
+        for version, kind, _ in versions:
+            ts = datetime.strptime(version, "%Y%m%d_%H%M%S_%f")
+            lb.insert("end", "%s  (%s)" % (ts.strftime("%Y-%m-%d %H:%M:%S"), "checkpoint" if kind == "full" else "changes"))
+
+        def on_restore(ev=None):
+            sel = lb.curselection()
+            if not sel:
+                return
+            msg = "Restore the metadata saved at %s?" % lb.get(sel[0]).split("  ")[0]
+            if self._dirty:
+                msg += "\nUnsaved changes will be lost."
+            if not messagebox.askyesno("Confirm", msg, parent=pop):
+                return
+            try:
+                restore_history_version(self._dataset_dir, versions[sel[0]][0])
+            except (OSError, ValueError, KeyError) as ex:
+                messagebox.showerror("Error", "Failed to restore: %s" % ex, parent=pop)
+                return
+            pop.destroy()
+            self._refresh_table()
+
+        btn_f = ttk.Frame(pop)
+        btn_f.grid(row=1, column=0, columnspan=2, pady=5)
+        ttk.Button(btn_f, text="Restore", command=on_restore).pack(side="left", padx=5)
+        ttk.Button(btn_f, text="Close", command=pop.destroy).pack(side="left", padx=5)
+        lb.bind("<Double-1>", on_restore)
+        pop.bind("<Escape>", lambda ev: pop.destroy())
+        lb.focus_set()
+        lb.selection_set(0)
+        lb.activate(0)
+
+    def _run_in_background(self, work: Callable[[], Any], done: Callable[[Any], None]):
+        # work() runs on a thread; done(result, or the exception it raised) runs on the Tk thread unless the
+        # dataset was reloaded meanwhile.
+        gen, q = self._jobs.current(), queue.Queue()
+
+        def run():
+            try:
+                q.put(work())
+            except Exception as ex:
+                q.put(ex)
+
+        def poll():
+            try:
+                res = q.get_nowait()
+            except queue.Empty:
+                self.root.after(LOAD_POLL_MS, poll)
+                return
+            if self._jobs.is_current(gen):
+                done(res)
+
+        threading.Thread(target=run, daemon=True).start()
+        self.root.after(LOAD_POLL_MS, poll)
+
+    def _on_gc(self):
+        if not self._dataset_dir:
+            messagebox.showinfo("Info", "Please select a directory first.")
+            return
+        if self._loading():
+            messagebox.showinfo("Info", "Please wait until the directory has finished loading.")
+            return
+        if not self._loaded:
+            # After a cancelled load the file list is empty or partial: every preview would look orphaned.
+            messagebox.showinfo("Info", "The directory was not fully loaded. Press Refresh before cleaning up.")
+            return
+        dd, paths, store = self._dataset_dir, list(self._video_paths), self._get_preview_store()
+        self._status.config(text="Looking for orphaned previews and metadata...")
+        self._run_in_background(lambda: find_orphans(dd, paths, store), lambda res: self._show_gc_report(dd, res))
+
+    def _show_gc_report(self, dd: Path, report):
+        if isinstance(report, Exception):
+            self._status.config(text="Clean up failed: %s" % report)
+            return
+        n_prev, n_meta = len(report["previews"]), len(report["metadata"])
+        if not n_prev and not n_meta and not report["manifest"]:
+            self._status.config(text="Nothing to clean up.")
+            return
+        self._show_row_count()
+        pop = tk.Toplevel(self.root)
+        pop.title("Clean up")
+        pop.transient(self.root)
+        ttk.Label(
+            pop,
+            text="%d orphaned preview(s), %.1f MB\n%d metadata entr%s for missing files:"
+            % (n_prev, report["preview_bytes"] / 1e6, n_meta, "y" if n_meta == 1 else "ies"),
+            justify="left",
+        ).grid(row=0, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+        lb = tk.Listbox(pop, height=min(15, max(3, n_meta)), width=60, font=("TkDefaultFont", 10))
+        lb.grid(row=1, column=0, sticky="nsew")
+        sb = ttk.Scrollbar(pop, orient="vertical", command=lb.yview)
+        sb.grid(row=1, column=1, sticky="ns")
+        lb.configure(yscrollcommand=sb.set)
+        pop.columnconfigure(0, weight=1)
+        pop.rowconfigure(1, weight=1)
+        for key in report["metadata"]:
+            lb.insert("end", preview_rel_path(dd, Path(key)))
+
+        def run(archive: bool):
+            if not archive and n_meta and not messagebox.askyesno(
+                "Confirm", "Permanently delete the tags and notes of %d missing file(s)?" % n_meta, parent=pop
+            ):
+                return
+            pop.destroy()
+            self._status.config(text="Cleaning up...")
+            store = self._get_preview_store()
+            self._run_in_background(
+                lambda: collect_orphans(dd, report, archive, store), lambda res: self._gc_done(report, res)
+            )
+
+        btn_f = ttk.Frame(pop)
+        btn_f.grid(row=2, column=0, columnspan=2, pady=5)
+        ttk.Button(btn_f, text="Archive", command=lambda: run(True)).pack(side="left", padx=5)
+        ttk.Button(btn_f, text="Delete", command=lambda: run(False)).pack(side="left", padx=5)
+        ttk.Button(btn_f, text="Cancel", command=pop.destroy).pack(side="left", padx=5)
+        pop.bind("<Escape>", lambda ev: pop.destroy())
+
+    def _gc_done(self, report: Dict[str, Any], res):
+        if isinstance(res, Exception):
+            self._status.config(text="Clean up failed: %s" % res)
+            return
+        msg = "%d preview(s) (%.1f MB) and %d metadata entr%s" % (
+            len(report["previews"]), report["preview_bytes"] / 1e6, len(report["metadata"]),
+            "y" if len(report["metadata"]) == 1 else "ies",
+        )
+        self._status.config(text=("Archived %s to %s." % (msg, res)) if res else "Removed %s." % msg)
+
     def _on_export(self):
         if not self._export_selected:
             messagebox.showinfo("Info", "No files selected for export.")
@@ -627,6 +1419,9 @@ class DatasetManagerApp:
             messagebox.showerror("Error", "Failed to export: %s" % ex)
 
     def _on_delete(self):
+        if self._loading():
+            messagebox.showinfo("Info", "Please wait until the directory has finished loading.")
+            return
         sel = self._tree.selection()
         if not sel:
             messagebox.showinfo("Info", "Select at least one file to delete.")
@@ -643,8 +1438,10 @@ class DatasetManagerApp:
             except OSError as ex:
                 failed.append("%s: %s" % (p.name, ex))
             self._metadata.pop(iid, None)
+            self._tag_index.remove(iid)
+            self._dirty.add(iid)
             self._export_selected.discard(iid)
-        self._video_paths = [p for p in self._video_paths if str(p.resolve()) not in sel]
+        self._video_paths = [p for p in self._video_paths if self._path_key(p) not in sel]
         self._populate_tree()
         self._update_status_after_load()
         if failed:
@@ -652,6 +1449,12 @@ class DatasetManagerApp:
         else:
             self._status.config(text="Deleted %d file(s)." % n)
 
+    def _on_close(self):
+        self._cancel_jobs()
+        self._stop_watch()
+        self._close_preview_store()
+        self.root.destroy()
+
     def run(self):
         self.root.mainloop()
 
@@ -1,3 +1,5 @@
 """Launch Dataset Video Manager GUI. Run: python run_dataset_manager.py"""
 import dataset_manager
-dataset_manager.run_dataset_manager()
+
+if __name__ == "__main__":
+    dataset_manager.run_dataset_manager()